@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+import question_cache
+from db import get_db_connection
+
+LEVELS = ('easy', 'medium', 'hard')
+# Correct answers in a row needed to move up a level
+PROMOTE_STREAK = 2
+SEEN_CACHE_SIZE = 5000
+
+class SeenSet:
+    """Bitset over question ids, one bit per question"""
+    __slots__ = ('bits',)
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def add(self, question_id):
+        byte = question_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        self.bits[byte] |= 1 << (question_id & 7)
+
+    def __contains__(self, question_id):
+        byte = question_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (question_id & 7)))
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+_seen = OrderedDict()   # user id -> SeenSet
+_seen_lock = threading.Lock()
+
+def load_seen(user_id):
+    with _seen_lock:
+        seen = _seen.get(user_id)
+        if seen is not None:
+            _seen.move_to_end(user_id)
+            return seen
+    row = get_db_connection().execute(
+        'SELECT seen FROM user_seen_questions WHERE user_id = ?', (user_id,)).fetchone()
+    seen = SeenSet(row[0] if row else b'')
+    _cache_seen(user_id, seen)
+    return seen
+
+def _cache_seen(user_id, seen):
+    with _seen_lock:
+        _seen[user_id] = seen
+        _seen.move_to_end(user_id)
+        while len(_seen) > SEEN_CACHE_SIZE:
+            _seen.popitem(last=False)
+
+def merge_seen(conn, question_ids_by_user):
+    """Add question ids to users' stored seen-sets; the caller commits.
+
+    Called by result_writer inside its write transaction, so the stored
+    bits are read and merged under the write lock and marks made by other
+    workers since this one loaded a set are kept.
+    """
+    for user_id, question_ids in question_ids_by_user.items():
+        row = conn.execute('SELECT seen FROM user_seen_questions WHERE user_id = ?', (user_id,)).fetchone()
+        seen = SeenSet(row[0] if row else b'')
+        for question_id in question_ids:
+            seen.add(question_id)
+        conn.execute('''
+            INSERT INTO user_seen_questions (user_id, seen) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET seen = excluded.seen
+        ''', (user_id, seen.to_bytes()))
+        _cache_seen(user_id, seen)
+
+def _reset_seen(user_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM user_seen_questions WHERE user_id = ?', (user_id,))
+    conn.commit()
+    _cache_seen(user_id, SeenSet())
+
+def starting_level(stats):
+    """Pick the first level from the user's history (user_stats aggregate)"""
+    if not stats['attempts']:
+        return 'easy'
+    if stats['average_percentage'] >= 80:
+        return 'hard'
+    if stats['average_percentage'] >= 60:
+        return 'medium'
+    return 'easy'
+
+def next_level(level, streak, was_correct):
+    """Return (level, streak) after an answer: step down on a miss, up after a streak"""
+    index = LEVELS.index(level)
+    if not was_correct:
+        return LEVELS[max(index - 1, 0)], 0
+    streak += 1
+    if streak >= PROMOTE_STREAK and index < len(LEVELS) - 1:
+        return LEVELS[index + 1], 0
+    return level, streak
+
+def _levels_from(level):
+    """The requested level first, then the nearest others"""
+    index = LEVELS.index(level)
+    return sorted(LEVELS, key=lambda other: abs(LEVELS.index(other) - index))
+
+def pick_question(user_id, level, exclude=()):
+    """Pick an unseen question at (or nearest to) level, never one in exclude.
+
+    When the user has seen every question in reach, their seen-set is
+    reset so the oldest questions come back into rotation.
+    """
+    seen = load_seen(user_id)
+    exclude = set(exclude)
+    for candidate_level in _levels_from(level):
+        question = question_cache.pick(candidate_level, lambda qid: qid in exclude or qid in seen)
+        if question:
+            return question
+    _reset_seen(user_id)
+    for candidate_level in _levels_from(level):
+        question = question_cache.pick(candidate_level, lambda qid: qid in exclude)
+        if question:
+            return question
+    return None
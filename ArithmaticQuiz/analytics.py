@@ -0,0 +1,255 @@
+"""Cohort analytics over every quiz result, live and archived.
+
+Results are folded in as chunks of NumPy column arrays into running
+aggregates: exact counts of each distinct percentage and time (so the
+percentiles are exact) and per-student regression sums. Each refresh only
+reads quiz_results rows past the last result id already folded in.
+"""
+import threading
+import time
+import numpy as np
+import archive
+import db
+
+CHUNK_SIZE = 100000
+# How often a worker folds in results saved since the last report
+REFRESH_INTERVAL = 30
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+SCORE_BINS = tuple(range(0, 101, 10))
+# Students listed on the page as most improved and most declined
+STUDENT_LIST_SIZE = 10
+
+class ValueCounts:
+    """How many times each distinct value was seen, sorted by value"""
+
+    def __init__(self):
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def add(self, chunk):
+        values, counts = np.unique(chunk, return_counts=True)
+        if len(self.values):
+            values, inverse = np.unique(np.concatenate((self.values, values)), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate((self.counts, counts))).astype(np.int64)
+        self.values, self.counts = values, counts
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def mean(self):
+        total = self.total()
+        return float(self.values @ self.counts / total) if total else None
+
+    def percentiles(self, percents=PERCENTILES):
+        """Nearest-rank percentiles"""
+        total = self.total()
+        if not total:
+            return {}
+        ranks = np.maximum(np.ceil(np.array(percents) / 100 * total), 1)
+        positions = np.searchsorted(np.cumsum(self.counts), ranks)
+        return {f'p{percent}': float(self.values[position]) for percent, position in zip(percents, positions)}
+
+    def histogram(self, bins=SCORE_BINS):
+        counts, _ = np.histogram(self.values, bins=bins, weights=self.counts)
+        return [{'from': low, 'to': high, 'count': int(count)}
+                for low, high, count in zip(bins, bins[1:], counts)]
+
+class Students:
+    """Per-student sums for a least-squares fit of percentage against attempt number"""
+    FIELDS = ('sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'first', 'last', 'best')
+
+    def __init__(self):
+        self.attempts = np.zeros(0, dtype=np.int64)
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(0))
+
+    def _grow(self, size):
+        if size > len(self.attempts):
+            extra = size - len(self.attempts)
+            self.attempts = np.concatenate((self.attempts, np.zeros(extra, dtype=np.int64)))
+            for field in self.FIELDS:
+                setattr(self, field, np.concatenate((getattr(self, field), np.zeros(extra))))
+
+    def add(self, user_ids, percentages):
+        """Fold in a chunk of results in attempt order (archived ones first, then by id)"""
+        self._grow(int(user_ids.max()) + 1)
+        size = len(self.attempts)
+        order = np.argsort(user_ids, kind='stable')
+        users, ys = user_ids[order], percentages[order]
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        ends = np.r_[starts[1:], len(users)] - 1
+        # Attempt number of each result: earlier attempts plus its place in the chunk
+        xs = self.attempts[users] + np.arange(len(users)) - np.repeat(starts, ends - starts + 1) + 1
+
+        first_seen = starts[self.attempts[users[starts]] == 0]
+        self.first[users[first_seen]] = ys[first_seen]
+        self.last[users[ends]] = ys[ends]
+        np.maximum.at(self.best, users, ys)
+        self.attempts += np.bincount(users, minlength=size)
+        self.sum_x += np.bincount(users, xs, size)
+        self.sum_y += np.bincount(users, ys, size)
+        self.sum_xy += np.bincount(users, xs * ys, size)
+        self.sum_xx += np.bincount(users, xs * xs, size)
+
+    def slopes(self):
+        """Percentage points gained per attempt, 0 for students with one attempt"""
+        n = self.attempts
+        denominator = n * self.sum_xx - self.sum_x ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = (n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        return np.where(denominator > 0, slopes, 0.0)
+
+class Cohort:
+    def __init__(self):
+        self.scores = ValueCounts()
+        self.times = ValueCounts()
+        self.students = Students()
+        self.last_result_id = 0
+        self.archived_rows = 0
+
+    def add(self, chunk):
+        """chunk columns: id, user_id, percentage, time_taken, in id order"""
+        self.scores.add(chunk[:, 2])
+        self.times.add(chunk[:, 3])
+        self.students.add(chunk[:, 1].astype(np.int64), chunk[:, 2])
+        self.last_result_id = int(chunk[-1, 0])
+
+_lock = threading.Lock()
+_cohort = Cohort()
+_last_refresh = 0.0
+
+def _add_archive(cohort, columns):
+    ids = np.asarray(columns['id'])
+    order = np.argsort(ids, kind='stable')
+    fields = [np.asarray(columns[name]) for name in ('id', 'user_id', 'percentage', 'time_taken')]
+    for start in range(0, len(order), CHUNK_SIZE):
+        rows = order[start:start + CHUNK_SIZE]
+        cohort.add(np.column_stack([field[rows].astype(np.float64) for field in fields]))
+    cohort.archived_rows = len(ids)
+    # Archived and live rows never overlap, so the live ones are read from the start
+    cohort.last_result_id = 0
+
+def refresh(force=False):
+    """Fold in results saved since the last refresh.
+
+    Starts over, reading the archive first, when the archive has grown,
+    since it may have taken rows this process never saw in quiz_results.
+    """
+    global _cohort, _last_refresh
+    if not force and _last_refresh and time.monotonic() - _last_refresh < REFRESH_INTERVAL:
+        return
+    with _lock:
+        conn = db.connect()
+        conn.row_factory = None
+        try:
+            # One snapshot for the archive bookkeeping and the live rows
+            conn.execute('BEGIN')
+            archived = archive.committed_columns(conn)
+            cohort = _cohort
+            if len(archived.get('id', ())) != cohort.archived_rows:
+                cohort = Cohort()
+                _add_archive(cohort, archived)
+            while True:
+                rows = conn.execute('''
+                    SELECT id, user_id, percentage, time_taken
+                    FROM quiz_results
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (cohort.last_result_id, CHUNK_SIZE)).fetchall()
+                if rows:
+                    cohort.add(np.array(rows, dtype=np.float64))
+                if len(rows) < CHUNK_SIZE:
+                    break
+        finally:
+            conn.rollback()
+            conn.close()
+        _cohort = cohort
+        _last_refresh = time.monotonic()
+
+def difficulty_breakdown():
+    """Answers, accuracy and mean response time per question difficulty"""
+    rows = db.get_db_connection().execute('''
+        SELECT q.difficulty, COUNT(*), SUM(s.attempts), SUM(s.correct), SUM(s.response_ms_sum)
+        FROM question_stats s
+        JOIN questions q ON q.id = s.question_id
+        WHERE s.attempts > 0
+        GROUP BY q.difficulty
+        ORDER BY q.difficulty
+    ''').fetchall()
+    return [{
+        'difficulty': difficulty,
+        'questions': questions,
+        'answers': answers,
+        'correct_rate': correct / answers * 100,
+        'mean_response_ms': response_ms / answers
+    } for difficulty, questions, answers, correct, response_ms in rows]
+
+def _student_rows(students, user_ids, slopes, names):
+    return [{
+        'user_id': int(user_id),
+        'username': names.get(int(user_id), '?'),
+        'attempts': int(students.attempts[user_id]),
+        'first_percentage': float(students.first[user_id]),
+        'latest_percentage': float(students.last[user_id]),
+        'mean_percentage': float(students.sum_y[user_id] / students.attempts[user_id]),
+        'best_percentage': float(students.best[user_id]),
+        'slope': float(slopes[user_id])
+    } for user_id in user_ids]
+
+def _usernames(user_ids=None):
+    """id -> username for user_ids, or for every user"""
+    conn = db.get_db_connection()
+    if user_ids is None:
+        return dict(conn.execute('SELECT id, username FROM users').fetchall())
+    if not len(user_ids):
+        return {}
+    placeholders = ','.join('?' * len(user_ids))
+    return dict(conn.execute(f'SELECT id, username FROM users WHERE id IN ({placeholders})',
+                             [int(user_id) for user_id in user_ids]).fetchall())
+
+def report(all_students=False):
+    """The cohort report as a JSON-ready dict.
+
+    Lists the most improved and most declined students, or every student
+    with all_students=True (for the export).
+    """
+    refresh()
+    # refresh() folds new chunks into the arrays in place
+    with _lock:
+        cohort = _cohort
+        students = cohort.students
+        slopes = students.slopes()
+        # Only students with two or more attempts have a trend
+        trending = np.flatnonzero(students.attempts >= 2)
+        by_slope = trending[np.argsort(slopes[trending], kind='stable')]
+        if all_students:
+            listed = {'students': np.flatnonzero(students.attempts)}
+            names = _usernames()
+        else:
+            top, bottom = by_slope[::-1][:STUDENT_LIST_SIZE], by_slope[:STUDENT_LIST_SIZE]
+            listed = {'most_improved': top[slopes[top] > 0], 'most_declined': bottom[slopes[bottom] < 0]}
+            names = _usernames(np.union1d(listed['most_improved'], listed['most_declined']))
+
+        summary = {
+            'results': cohort.scores.total(),
+            'last_result_id': cohort.last_result_id,
+            'percentage': {
+                'mean': cohort.scores.mean(),
+                'percentiles': cohort.scores.percentiles(),
+                'histogram': cohort.scores.histogram()
+            },
+            'time_taken': {
+                'mean': cohort.times.mean(),
+                'percentiles': cohort.times.percentiles()
+            },
+            'trends': {
+                'students': int(np.count_nonzero(students.attempts)),
+                'improving': int(np.count_nonzero(slopes[trending] > 0)),
+                'declining': int(np.count_nonzero(slopes[trending] < 0))
+            }
+        }
+        for key, ids in listed.items():
+            summary[key] = _student_rows(students, ids, slopes, names)
+    summary['difficulty'] = difficulty_breakdown()
+    return summary
@@ -1,447 +1,960 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import sqlite3
-import random
-import time
-import os
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-
-app = Flask(__name__)
-app.secret_key = 'arithmetic_quiz_secret_key_2025'
-
-DATABASE = 'quiz.db'
-
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    """Initialize database with proper schema handling"""
-    try:
-        conn = get_db_connection()
-        
-        # Check if tables exist and have correct schema
-        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='quiz_results'")
-        table_exists = cursor.fetchone()
-        
-        if table_exists:
-            # Check if user_id column exists
-            cursor = conn.execute("PRAGMA table_info(quiz_results)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'user_id' not in columns:
-                # Drop and recreate table with correct schema
-                conn.execute('DROP TABLE IF EXISTS quiz_results')
-                print("Dropped old quiz_results table with incorrect schema")
-        
-        # Create users table if not exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT NOT NULL,
-                password TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create questions table if not exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                option1 TEXT NOT NULL,
-                option2 TEXT NOT NULL,
-                option3 TEXT NOT NULL,
-                option4 TEXT NOT NULL,
-                correct_answer INTEGER NOT NULL,
-                difficulty TEXT DEFAULT 'medium'
-            )
-        ''')
-        
-        # Create quiz_results table with correct schema
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                score INTEGER NOT NULL,
-                total_questions INTEGER NOT NULL,
-                percentage REAL NOT NULL,
-                time_taken INTEGER NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Create admin user if not exists
-        admin_exists = conn.execute('SELECT * FROM users WHERE username = ?', ('admin',)).fetchone()
-        if not admin_exists:
-            admin_password = generate_password_hash('admin123')
-            conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                        ('admin', 'admin@apquiz.com', admin_password))
-            print("Admin user created")
-        
-        # Insert sample questions if table is empty
-        question_count = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
-        if question_count == 0:
-            sample_questions = [
-                ("What is the 10th term of the AP: 3, 8, 13, 18...?", "48", "53", "58", "63", 2, "easy"),
-                ("Find the sum of first 10 terms of AP: 2, 5, 8, 11...", "155", "165", "175", "185", 2, "medium"),
-                ("Which of the following is NOT an arithmetic progression?", "2, 4, 6, 8", "1, 4, 9, 16", "5, 10, 15, 20", "3, 7, 11, 15", 2, "easy"),
-                ("In AP: 7, _, 19, _, 31 - find the first missing term", "13", "15", "11", "12", 1, "medium"),
-                ("The common difference of AP: -5, -1, 3, 7... is", "4", "-4", "6", "-6", 1, "easy"),
-                ("Sum of first n natural numbers is given by", "n(n+1)", "n(n+1)/2", "n(n-1)/2", "2n+1", 2, "medium"),
-                ("If 5th term of AP is 18 and 10th term is 38, find common difference", "4", "5", "6", "3", 1, "hard"),
-                ("The 20th term of sequence 100, 95, 90, 85... is", "0", "5", "10", "15", 2, "medium"),
-                ("How many terms of AP: 3, 7, 11... make sum 300?", "10", "12", "15", "18", 2, "hard"),
-                ("If first term is 'a' and common difference is 'd', nth term is", "a + nd", "a + (n-1)d", "a + (n+1)d", "nd - a", 2, "easy"),
-                ("Find the sum of first 15 terms of AP: 4, 9, 14, 19...", "525", "545", "565", "585", 3, "medium"),
-                ("Which term of AP: 21, 18, 15, 12... is the first negative term?", "7th", "8th", "9th", "10th", 2, "hard"),
-                ("The arithmetic mean of first n odd numbers is", "n", "(n+1)/2", "n/2", "2n-1", 1, "medium"),
-                ("In an AP, if a = 5, d = 3, then S₁₀ = ?", "185", "195", "175", "165", 1, "easy"),
-                ("The middle term of AP: 1, 4, 7, ..., 97 is", "49", "51", "47", "53", 1, "medium")
-            ]
-            
-            conn.executemany('''
-                INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', sample_questions)
-            print(f"Inserted {len(sample_questions)} sample questions")
-        
-        conn.commit()
-        print("Database initialized successfully!")
-        
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        if 'conn' in locals():
-            conn.rollback()
-    finally:
-        if 'conn' in locals():
-            conn.close()
-
-def create_user(username, email, password):
-    conn = get_db_connection()
-    hashed_password = generate_password_hash(password)
-    conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                (username, email, hashed_password))
-    conn.commit()
-    conn.close()
-
-def get_user(username):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    conn.close()
-    return dict(user) if user else None
-
-def get_questions():
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions').fetchall()
-    conn.close()
-    return [dict(q) for q in questions]
-
-def add_question(question, option1, option2, option3, option4, correct_answer, difficulty):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (question, option1, option2, option3, option4, correct_answer, difficulty))
-    conn.commit()
-    conn.close()
-
-def save_result(user_id, score, total, time_taken, percentage):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, score, total, percentage, time_taken))
-    conn.commit()
-    conn.close()
-
-def get_user_results(user_id):
-    conn = get_db_connection()
-    results = conn.execute('''
-        SELECT * FROM quiz_results 
-        WHERE user_id = ? 
-        ORDER BY timestamp DESC
-    ''', (user_id,)).fetchall()
-    conn.close()
-    return [dict(r) for r in results]
-
-def get_all_results():
-    conn = get_db_connection()
-    results = conn.execute('''
-        SELECT qr.*, u.username, u.email 
-        FROM quiz_results qr 
-        JOIN users u ON qr.user_id = u.id 
-        ORDER BY qr.timestamp DESC
-    ''').fetchall()
-    conn.close()
-    return [dict(r) for r in results]
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username']
-        email = request.form['email']
-        password = request.form['password']
-        confirm_password = request.form['confirm_password']
-        
-        if password != confirm_password:
-            flash('Passwords do not match!', 'error')
-            return render_template('register.html')
-        
-        if get_user(username):
-            flash('Username already exists!', 'error')
-            return render_template('register.html')
-        
-        try:
-            create_user(username, email, password)
-            flash('Registration successful! Please login.', 'success')
-            return redirect(url_for('login'))
-        except Exception as e:
-            flash('Registration failed. Please try again.', 'error')
-            print(f"Registration error: {e}")
-    
-    return render_template('register.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        
-        try:
-            user = get_user(username)
-            if user and check_password_hash(user['password'], password):
-                session['user_id'] = user['id']
-                session['username'] = user['username']
-                flash('Login successful!', 'success')
-                return redirect(url_for('dashboard'))
-            else:
-                flash('Invalid username or password!', 'error')
-        except Exception as e:
-            flash('Login failed. Please try again.', 'error')
-            print(f"Login error: {e}")
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
-
-@app.route('/dashboard')
-def dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    try:
-        user_results = get_user_results(session['user_id'])
-        return render_template('dashboard.html', results=user_results)
-    except Exception as e:
-        flash('Error loading dashboard.', 'error')
-        print(f"Dashboard error: {e}")
-        return redirect(url_for('index'))
-
-@app.route('/prerequisites')
-def prerequisites():
-    return render_template('prerequisites.html')
-
-@app.route('/tutorials')
-def tutorials():
-    return render_template('tutorials.html')
-
-@app.route('/quiz')
-def quiz():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    try:
-        questions = get_questions()
-        if not questions:
-            flash('No questions available. Please contact administrator.', 'error')
-            return redirect(url_for('dashboard'))
-        
-        # Shuffle questions and store in session
-        random.shuffle(questions)
-        session['questions'] = questions[:10]  # Limit to 10 questions
-        session['current_question'] = 0
-        session['score'] = 0
-        session['start_time'] = time.time()
-        session['answers'] = []
-        
-        return render_template('quiz.html', 
-                             question=session['questions'][0], 
-                             question_num=1, 
-                             total=len(session['questions']))
-    except Exception as e:
-        flash('Error starting quiz. Please try again.', 'error')
-        print(f"Quiz error: {e}")
-        return redirect(url_for('dashboard'))
-
-@app.route('/answer', methods=['POST'])
-def answer():
-    if 'user_id' not in session or 'questions' not in session:
-        return redirect(url_for('quiz'))
-    
-    try:
-        current_q = session['current_question']
-        selected_answer = int(request.form['answer'])
-        correct_answer = session['questions'][current_q]['correct_answer']
-        
-        # Store answer
-        session['answers'].append({
-            'question': session['questions'][current_q]['question'],
-            'selected': selected_answer,
-            'correct': correct_answer,
-            'is_correct': selected_answer == correct_answer,
-            'options': [
-                session['questions'][current_q]['option1'],
-                session['questions'][current_q]['option2'],
-                session['questions'][current_q]['option3'],
-                session['questions'][current_q]['option4']
-            ]
-        })
-        
-        # Update score
-        if selected_answer == correct_answer:
-            session['score'] += 1
-        
-        session['current_question'] += 1
-        
-        # Check if quiz is complete
-        if session['current_question'] >= len(session['questions']):
-            return redirect(url_for('result'))
-        
-        # Next question
-        next_question = session['questions'][session['current_question']]
-        return render_template('quiz.html', 
-                             question=next_question, 
-                             question_num=session['current_question'] + 1, 
-                             total=len(session['questions']))
-    except Exception as e:
-        flash('Error processing answer. Please try again.', 'error')
-        print(f"Answer error: {e}")
-        return redirect(url_for('quiz'))
-
-@app.route('/result')
-def result():
-    if 'user_id' not in session or 'score' not in session:
-        return redirect(url_for('quiz'))
-    
-    try:
-        end_time = time.time()
-        time_taken = int(end_time - session['start_time'])
-        score = session['score']
-        total = len(session['questions'])
-        percentage = (score / total) * 100
-        
-        # Save result to database
-        save_result(session['user_id'], score, total, time_taken, percentage)
-        
-        # Store for display
-        answers = session.get('answers', [])
-        
-        # Clear quiz session data
-        quiz_keys = ['questions', 'current_question', 'score', 'start_time', 'answers']
-        for key in quiz_keys:
-            session.pop(key, None)
-        
-        return render_template('result.html', 
-                             score=score, 
-                             total=total, 
-                             percentage=percentage, 
-                             time_taken=time_taken,
-                             answers=answers)
-    except Exception as e:
-        flash('Error displaying results. Please try again.', 'error')
-        print(f"Result error: {e}")
-        return redirect(url_for('dashboard'))
-
-@app.route('/admin')
-def admin():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    # Simple admin check
-    if session['username'] != 'admin':
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('dashboard'))
-    
-    try:
-        questions = get_questions()
-        all_results = get_all_results()
-        return render_template('admin.html', questions=questions, results=all_results)
-    except Exception as e:
-        flash('Error loading admin panel.', 'error')
-        print(f"Admin error: {e}")
-        return redirect(url_for('dashboard'))
-
-@app.route('/add_question', methods=['POST'])
-def add_question_route():
-    if 'user_id' not in session or session['username'] != 'admin':
-        return redirect(url_for('dashboard'))
-    
-    try:
-        question = request.form['question']
-        option1 = request.form['option1']
-        option2 = request.form['option2']
-        option3 = request.form['option3']
-        option4 = request.form['option4']
-        correct_answer = int(request.form['correct_answer'])
-        difficulty = request.form['difficulty']
-        
-        add_question(question, option1, option2, option3, option4, correct_answer, difficulty)
-        flash('Question added successfully!', 'success')
-    except Exception as e:
-        flash('Error adding question. Please try again.', 'error')
-        print(f"Add question error: {e}")
-    
-    return redirect(url_for('admin'))
-
-@app.route('/all_results')
-def all_results():
-    if 'user_id' not in session or session['username'] != 'admin':
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('dashboard'))
-    
-    try:
-        results = get_all_results()
-        return render_template('all_results.html', results=results)
-    except Exception as e:
-        flash('Error loading results.', 'error')
-        print(f"All results error: {e}")
-        return redirect(url_for('admin'))
-
-# Error handlers
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return render_template('500.html'), 500
-
-# Initialize database and start application
-if __name__ == '__main__':
-    print("Starting Arithmetic Progression Quiz Application...")
-    
-    try:
-        # Initialize database
-        print("Initializing database...")
-        init_db()
-        
-        # Start Flask server
-        print("Starting Flask server...")
-        print("Server will be available at: http://127.0.0.1:5000")
-        app.run(host='127.0.0.1', port=5000, debug=True)
-        
-    except Exception as e:
-        print(f"Error starting application: {e}")
-        print("Please check if port 5000 is available or try a different port.")
+import time
+# Taken before the framework imports so the startup report includes them
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, flash, Response, stream_with_context, jsonify
+import csv
+import io
+import json
+import os
+from datetime import datetime
+import click
+import db
+import metrics
+import page_cache
+import question_cache
+import question_generator
+import adaptive
+import passwords
+import leaderboard
+import question_import
+import user_import
+import quiz_store
+import exams
+import archive
+from models import (Question, UsernameTaken, answer_rows, create_exam, get_exam, get_exams, init_db, create_user, update_password_hash, get_user, get_user_by_id,
+                    get_questions_by_ids, get_questions_with_stats, add_question, save_result,
+                    get_user_results, get_user_stats, get_results_page, iter_all_results, get_archive_summary)
+
+bp = Blueprint('main', __name__, cli_group=None)
+
+# Server-side quiz attempt state, replaced by create_app() from QUIZ_STORE
+attempt_store = None
+
+# Seconds spent in each startup phase of this process, reported by prepare()
+startup_timings = {}
+metrics.describe('quiz_startup_seconds', 'Time spent in each startup phase of this process')
+
+RESULTS_PAGE_SIZE = 50
+DASHBOARD_RECENT_RESULTS = 10
+# How often each worker drops expired attempts from the attempt stores
+PURGE_INTERVAL = 60
+_last_purge = 0.0
+
+@bp.before_app_request
+def check_session_user():
+    """Log out sessions whose user no longer exists (a cached lookup per request)"""
+    if 'user_id' in session and get_user_by_id(session['user_id']) is None:
+        session.clear()
+
+@bp.before_app_request
+def purge_expired_attempts():
+    """Drop expired attempts, at most once per PURGE_INTERVAL in each worker"""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+    try:
+        # With QUIZ_STORE=sqlite both stores share quiz_attempts; the second delete finds nothing
+        purged = attempt_store.purge_expired() + exams.store.purge_expired()
+        if purged:
+            print(f"Purged {purged} expired quiz attempts")
+    except Exception as e:
+        print(f"Attempt purge error: {e}")
+
+@bp.route('/')
+@page_cache.cached_page('index.html')
+def index():
+    return render_template('index.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        email = request.form['email']
+        password = request.form['password']
+        confirm_password = request.form['confirm_password']
+        
+        if password != confirm_password:
+            flash('Passwords do not match!', 'error')
+            return render_template('register.html')
+        
+        try:
+            create_user(username, email, password)
+            flash('Registration successful! Please login.', 'success')
+            return redirect(url_for('main.login'))
+        except UsernameTaken:
+            flash('Username already exists!', 'error')
+            return render_template('register.html'), 409
+        except passwords.HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503
+        except Exception as e:
+            flash('Registration failed. Please try again.', 'error')
+            print(f"Registration error: {e}")
+    
+    return render_template('register.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        
+        try:
+            user = get_user(username)
+            if user and passwords.verify(user.id, user.password, password):
+                # Upgrade hashes made with older parameters while we have the password
+                if passwords.needs_rehash(user.password):
+                    update_password_hash(user.id, passwords.hash_password(password))
+                session['user_id'] = user.id
+                session['username'] = user.username
+                flash('Login successful!', 'success')
+                return redirect(url_for('main.dashboard'))
+            else:
+                flash('Invalid username or password!', 'error')
+        except passwords.HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        except Exception as e:
+            flash('Login failed. Please try again.', 'error')
+            print(f"Login error: {e}")
+    
+    return render_template('login.html')
+
+@bp.route('/logout')
+def logout():
+    session.clear()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('main.index'))
+
+@bp.route('/dashboard')
+def dashboard():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
+    
+    try:
+        stats = get_user_stats(session['user_id'])
+        # Paging back continues into archived results once the live ones run out
+        cursor = parse_results_cursor(request.args.get('cursor'))
+        user_results = get_user_results(session['user_id'], limit=DASHBOARD_RECENT_RESULTS + 1, before=cursor)
+        next_cursor = None
+        if len(user_results) > DASHBOARD_RECENT_RESULTS:
+            user_results = user_results[:DASHBOARD_RECENT_RESULTS]
+            next_cursor = format_results_cursor((user_results[-1].timestamp, user_results[-1].id))
+        rank, ranked_users = leaderboard.get_rank(session['user_id'])
+        week_rank, week_users = leaderboard.get_rank(session['user_id'], 'week')
+        now = time.time()
+        upcoming_exams = get_exams(now)
+        return render_template('dashboard.html', results=user_results, stats=stats,
+                             next_cursor=next_cursor, first_page=cursor is None,
+                             rank=rank, ranked_users=ranked_users,
+                             week_rank=week_rank, week_users=week_users,
+                             exams=upcoming_exams, now=now,
+                             exam_states=exams.attempt_states(session['user_id'], now) if upcoming_exams else {})
+    except Exception as e:
+        flash('Error loading dashboard.', 'error')
+        print(f"Dashboard error: {e}")
+        return redirect(url_for('main.index'))
+
+@bp.route('/prerequisites')
+@page_cache.cached_page('prerequisites.html')
+def prerequisites():
+    return render_template('prerequisites.html')
+
+@bp.route('/tutorials')
+@page_cache.cached_page('tutorials.html')
+def tutorials():
+    return render_template('tutorials.html')
+
+def current_store():
+    """Timed exam attempts are kept in the shared exam store"""
+    return exams.store if 'exam_id' in session else attempt_store
+
+def start_attempt(mode=None, exam=None):
+    """Create a server-side attempt for the logged-in user and return (attempt, questions).
+
+    Returns (None, []) when there are no questions, and (None, None) for an
+    exam the user has already taken; an exam attempt still running is
+    returned instead of a new one.
+    """
+    attempt = {
+        'user_id': session['user_id'],
+        'question_ids': [],
+        'current_question': 0,
+        'score': 0,
+        'start_time': time.time(),
+        'answers': []
+    }
+    
+    if exam is not None:
+        # Timed exam: the scheduler finalises the attempt at its deadline
+        questions = question_cache.sample(exam.question_count)
+        if not questions:
+            return None, []
+        attempt.update({'question_ids': [q.id for q in questions], 'exam_id': exam.id,
+                        'deadline': exams.deadline_for(exam, attempt['start_time'])})
+    elif mode == 'practice':
+        # Fresh generated questions; they live only in the attempt
+        attempt['questions'] = question_generator.generate(10)
+        questions = attempt_questions(attempt)
+    elif mode == 'adaptive':
+        # Only the first question is chosen now; record_answer() picks the rest
+        level = adaptive.starting_level(get_user_stats(session['user_id']))
+        question = adaptive.pick_question(session['user_id'], level)
+        if question is None:
+            return None, []
+        questions = [question]
+        attempt.update({'question_ids': [question.id], 'length': 10,
+                        'level': level, 'streak': 0})
+    else:
+        # Sample 10 questions from the cached bank
+        questions = question_cache.sample(10)
+        if not questions:
+            return None, []
+        attempt['question_ids'] = [q.id for q in questions]
+    
+    # Keep attempt state server-side; the session only carries ids
+    attempt_id = quiz_store.new_attempt_id()
+    if exam is not None:
+        # One attempt per exam: hand back the running one, refuse a finished one
+        started_id = attempt_id
+        attempt_id, attempt = exams.store.start(session['user_id'], exam.id, attempt_id, attempt)
+        if attempt is None or 'result' in attempt or exams.timed_out(attempt):
+            return None, None
+        if attempt_id != started_id:
+            questions = attempt_questions(attempt)
+        session['exam_id'] = exam.id
+    else:
+        session.pop('exam_id', None)
+        current_store().save(attempt_id, attempt)
+    session['attempt_id'] = attempt_id
+    session['question_ids'] = attempt['question_ids']
+    return attempt, questions
+
+def public_question(question):
+    """Question payload for the client, without the correct answer"""
+    return {
+        'question': question.question,
+        'options': [question.option1, question.option2, question.option3, question.option4],
+        'difficulty': question.difficulty
+    }
+
+@bp.route('/quiz')
+def quiz():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
+    
+    try:
+        exam = None
+        if request.args.get('exam'):
+            exam = open_exam(request.args.get('exam', type=int))
+            if exam is None:
+                flash('This exam is not open.', 'error')
+                return redirect(url_for('main.dashboard'))
+        
+        attempt, questions = start_attempt(request.args.get('mode'), exam)
+        if questions is None:
+            flash('You have already taken this exam.', 'info')
+            return redirect(url_for('main.dashboard'))
+        if attempt is None:
+            flash('No questions available. Please contact administrator.', 'error')
+            return redirect(url_for('main.dashboard'))
+        if attempt['current_question'] >= attempt_total(attempt):
+            return redirect(url_for('main.result'))
+        
+        # In client mode the page carries every question and submits once;
+        # adaptive and timed attempts go through /answer question by question
+        client_mode = (current_app.config['QUIZ_CLIENT_MODE'] and request.args.get('client') != '0'
+                       and 'level' not in attempt and 'deadline' not in attempt)
+        client_questions = [public_question(q) for q in questions] if client_mode else None
+        
+        return render_template('quiz.html', 
+                             question=questions[attempt['current_question']], 
+                             question_num=attempt['current_question'] + 1, 
+                             total=attempt_total(attempt),
+                             client_questions=client_questions,
+                             time_left=time_left(attempt),
+                             exam_grace=exams.GRACE_SECONDS)
+    except Exception as e:
+        flash('Error starting quiz. Please try again.', 'error')
+        print(f"Quiz error: {e}")
+        return redirect(url_for('main.dashboard'))
+
+def open_exam(exam_id):
+    """Return the exam if it is currently inside its window, else None"""
+    exam = get_exam(exam_id) if exam_id else None
+    if exam is None or not exams.is_open(exam, time.time()):
+        return None
+    return exam
+
+def time_left(attempt):
+    """Whole seconds until a timed attempt's deadline, None if untimed"""
+    if 'deadline' not in attempt:
+        return None
+    return max(0, int(attempt['deadline'] - time.time()))
+
+def get_attempt():
+    """Return the current user's in-progress attempt, or None"""
+    attempt_id = session.get('attempt_id')
+    if attempt_id is None:
+        return None
+    attempt = current_store().get(attempt_id)
+    if attempt is None or attempt['user_id'] != session.get('user_id'):
+        return None
+    return attempt
+
+def attempt_total(attempt):
+    if 'length' in attempt:
+        return attempt['length']
+    return len(attempt['questions']) if 'questions' in attempt else len(attempt['question_ids'])
+
+def attempt_question(attempt, index):
+    """Return question index of an attempt, generated or from the bank"""
+    if 'questions' in attempt:
+        return Question(None, **attempt['questions'][index])
+    return question_cache.get(attempt['question_ids'][index])
+
+def attempt_questions(attempt):
+    """Every question of an attempt in order, fetched in one batch"""
+    if 'questions' in attempt:
+        return [Question(None, **q) for q in attempt['questions']]
+    return get_questions_by_ids(attempt['question_ids'])
+
+def record_answer(attempt, selected_answer, response_ms=None):
+    """Score the next unanswered question of an attempt (caller saves it)"""
+    question = attempt_question(attempt, attempt['current_question'])
+    is_correct = selected_answer == question.correct_answer
+    now = time.time()
+    if response_ms is None:
+        response_ms = int((now - attempt.get('last_answer_at', attempt['start_time'])) * 1000)
+    attempt['last_answer_at'] = now
+    attempt.setdefault('response_ms', []).append(max(0, int(response_ms)))
+    attempt['answers'].append(selected_answer)
+    if is_correct:
+        attempt['score'] += 1
+    attempt['current_question'] += 1
+    
+    # Adaptive attempts choose the next question from the running result
+    if 'level' in attempt and attempt['current_question'] < attempt['length']:
+        attempt['level'], attempt['streak'] = adaptive.next_level(
+            attempt['level'], attempt['streak'], is_correct)
+        next_question = adaptive.pick_question(attempt['user_id'], attempt['level'],
+                                               exclude=attempt['question_ids'])
+        if next_question is None:
+            # Bank exhausted: finish early
+            attempt['length'] = attempt['current_question']
+        else:
+            attempt['question_ids'].append(next_question.id)
+
+def finalize_attempt(attempt):
+    """Save the attempt's result once and return the result summary"""
+    if 'result' in attempt:
+        return attempt['result']
+    
+    if 'deadline' in attempt:
+        # Whoever clears the deadline first saves the result, so an attempt
+        # the scheduler already finalised is only read back
+        result = exams.finalize(db.get_db_connection(), session['attempt_id'], attempt)
+        if result is None:
+            return exams.store.get(session['attempt_id'])['result']
+        return result
+    
+    time_taken = int(time.time() - attempt['start_time'])
+    score = attempt['score']
+    total = attempt_total(attempt)
+    percentage = (score / total) * 100
+    
+    # Per-answer rows for bank questions (generated ones have no id)
+    answers = []
+    if attempt['question_ids']:
+        answers = answer_rows(session['attempt_id'], attempt_questions(attempt),
+                              attempt['answers'], attempt.get('response_ms', []))
+    
+    # Save result to database
+    save_result(attempt['user_id'], score, total, time_taken, percentage, answers, attempt['question_ids'])
+    
+    attempt['result'] = {
+        'score': score,
+        'total': total,
+        'percentage': percentage,
+        'time_taken': time_taken
+    }
+    current_store().save(session['attempt_id'], attempt)
+    return attempt['result']
+
+def clear_attempt():
+    store = current_store()
+    attempt_id = session.pop('attempt_id', None)
+    session.pop('question_ids', None)
+    session.pop('exam_id', None)
+    if attempt_id is not None:
+        store.delete(attempt_id)
+
+@bp.route('/answer', methods=['POST'])
+def answer():
+    if 'user_id' not in session or 'attempt_id' not in session:
+        return redirect(url_for('main.quiz'))
+    
+    attempt = get_attempt()
+    if attempt is None:
+        flash('Your quiz session has expired. Please start again.', 'error')
+        clear_attempt()
+        return redirect(url_for('main.quiz'))
+    
+    try:
+        total = attempt_total(attempt)
+        if attempt['current_question'] >= total or 'result' in attempt:
+            return redirect(url_for('main.result'))
+        if exams.timed_out(attempt):
+            flash("Time is up! Your exam was submitted with the answers you gave.", 'info')
+            return redirect(url_for('main.result'))
+        
+        record_answer(attempt, int(request.form['answer']))
+        current_store().save(session['attempt_id'], attempt)
+        
+        # Check if quiz is complete
+        if attempt['current_question'] >= total:
+            return redirect(url_for('main.result'))
+        
+        # Next question
+        next_question = attempt_question(attempt, attempt['current_question'])
+        return render_template('quiz.html', 
+                             question=next_question, 
+                             question_num=attempt['current_question'] + 1, 
+                             total=total,
+                             time_left=time_left(attempt),
+                             exam_grace=exams.GRACE_SECONDS)
+    except Exception as e:
+        flash('Error processing answer. Please try again.', 'error')
+        print(f"Answer error: {e}")
+        return redirect(url_for('main.quiz'))
+
+def review_answers(attempt):
+    """Rebuild the per-question review shown on the result page"""
+    answers = []
+    for question, selected in zip(attempt_questions(attempt), attempt['answers']):
+        answers.append({
+            'question': question.question,
+            'selected': selected,
+            'correct': question.correct_answer,
+            'is_correct': selected == question.correct_answer,
+            'options': [question.option1, question.option2, question.option3, question.option4]
+        })
+    return answers
+
+@bp.route('/result')
+def result():
+    if 'user_id' not in session or 'attempt_id' not in session:
+        return redirect(url_for('main.quiz'))
+    
+    attempt = get_attempt()
+    if attempt is None:
+        flash('Your quiz session has expired. Please start again.', 'error')
+        clear_attempt()
+        return redirect(url_for('main.quiz'))
+    
+    try:
+        summary = finalize_attempt(attempt)
+        
+        # Store for display
+        answers = review_answers(attempt)
+        
+        # Clear quiz attempt data
+        clear_attempt()
+        
+        return render_template('result.html', 
+                             score=summary['score'], 
+                             total=summary['total'], 
+                             percentage=summary['percentage'], 
+                             time_taken=summary['time_taken'],
+                             timed_out=summary.get('timed_out', False),
+                             answers=answers)
+    except Exception as e:
+        flash('Error displaying results. Please try again.', 'error')
+        print(f"Result error: {e}")
+        return redirect(url_for('main.dashboard'))
+
+# JSON quiz API
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+def parse_answer(value):
+    selected = int(value)
+    if selected not in (1, 2, 3, 4):
+        raise ValueError(f"answer must be 1-4, got {selected}")
+    return selected
+
+@bp.route('/api/quiz/start', methods=['POST'])
+def api_quiz_start():
+    if 'user_id' not in session:
+        return api_error('Login required', 401)
+    
+    try:
+        payload = request.get_json(silent=True) or {}
+        exam = None
+        if payload.get('exam'):
+            exam = open_exam(payload['exam'])
+            if exam is None:
+                return api_error('Exam is not open', 409)
+        attempt, questions = start_attempt(payload.get('mode') or request.args.get('mode'), exam)
+        if questions is None:
+            return api_error('Exam already taken', 409)
+        if attempt is None:
+            return api_error('No questions available', 503)
+        # Adaptive attempts return one question now and the next from /api/quiz/answer;
+        # a resumed exam attempt reports how many of its questions are answered
+        return jsonify({
+            'attempt_id': session['attempt_id'],
+            'answered': attempt['current_question'],
+            'total': attempt_total(attempt),
+            'adaptive': 'level' in attempt,
+            'time_left': time_left(attempt),
+            'questions': [public_question(q) for q in questions]
+        })
+    except Exception as e:
+        print(f"API start error: {e}")
+        return api_error('Error starting quiz', 500)
+
+@bp.route('/api/quiz/answer', methods=['POST'])
+def api_quiz_answer():
+    if 'user_id' not in session:
+        return api_error('Login required', 401)
+    attempt = get_attempt()
+    if attempt is None:
+        return api_error('No quiz in progress', 404)
+    if 'result' in attempt or attempt['current_question'] >= attempt_total(attempt):
+        return api_error('All questions already answered', 409)
+    if exams.timed_out(attempt):
+        return api_error('Time is up', 409)
+    
+    try:
+        selected = parse_answer((request.get_json(silent=True) or {}).get('answer'))
+    except (TypeError, ValueError) as e:
+        return api_error(str(e), 400)
+    
+    record_answer(attempt, selected)
+    current_store().save(session['attempt_id'], attempt)
+    payload = {
+        'answered': attempt['current_question'],
+        'total': attempt_total(attempt)
+    }
+    if 'level' in attempt and attempt['current_question'] < attempt_total(attempt):
+        payload['next_question'] = public_question(attempt_question(attempt, attempt['current_question']))
+    return jsonify(payload)
+
+@bp.route('/api/quiz/submit', methods=['POST'])
+def api_quiz_submit():
+    if 'user_id' not in session:
+        return api_error('Login required', 401)
+    attempt = get_attempt()
+    if attempt is None:
+        return api_error('No quiz in progress', 404)
+    
+    # Answers sent after the deadline are ignored; the attempt is still finalised
+    if 'result' not in attempt and not exams.timed_out(attempt):
+        payload = request.get_json(silent=True) or {}
+        try:
+            answers = [parse_answer(a) for a in payload.get('answers', [])]
+            # Optional per-question response times measured by the client
+            response_times = [int(ms) for ms in payload.get('response_ms', [])]
+        except (TypeError, ValueError) as e:
+            return api_error(str(e), 400)
+        remaining = attempt_total(attempt) - attempt['current_question']
+        if len(answers) > remaining:
+            return api_error(f"Expected at most {remaining} answers", 400)
+        if len(response_times) != len(answers):
+            response_times = [None] * len(answers)
+        for selected, response_ms in zip(answers, response_times):
+            record_answer(attempt, selected, response_ms)
+    
+    try:
+        summary = finalize_attempt(attempt)
+    except Exception as e:
+        print(f"API submit error: {e}")
+        return api_error('Error saving result', 500)
+    return jsonify(dict(summary, attempt_id=session['attempt_id'], result_url=url_for('main.result')))
+
+@bp.route('/api/quiz/result')
+def api_quiz_result():
+    if 'user_id' not in session:
+        return api_error('Login required', 401)
+    attempt = get_attempt()
+    if attempt is None or 'result' not in attempt:
+        return api_error('No finished quiz', 404)
+    return jsonify(dict(attempt['result'], answers=review_answers(attempt)))
+
+LEADERBOARD_PAGE_SIZE = 20
+
+def leaderboard_args():
+    period = request.args.get('period', 'global')
+    if period not in leaderboard.PERIODS:
+        period = 'global'
+    page = max(request.args.get('page', 1, type=int), 1)
+    return period, page
+
+@bp.route('/leaderboard')
+def leaderboard_page():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
+    
+    try:
+        period, page = leaderboard_args()
+        entries, size = leaderboard.get_page(period, page, LEADERBOARD_PAGE_SIZE)
+        rank, _ = leaderboard.get_rank(session['user_id'], period)
+        return render_template('leaderboard.html', 
+                             entries=entries, 
+                             period=period, 
+                             page=page,
+                             has_next=page * LEADERBOARD_PAGE_SIZE < size,
+                             rank=rank,
+                             size=size)
+    except Exception as e:
+        flash('Error loading leaderboard.', 'error')
+        print(f"Leaderboard error: {e}")
+        return redirect(url_for('main.dashboard'))
+
+@bp.route('/api/leaderboard')
+def api_leaderboard():
+    if 'user_id' not in session:
+        return api_error('Login required', 401)
+    period, page = leaderboard_args()
+    per_page = min(max(request.args.get('per_page', LEADERBOARD_PAGE_SIZE, type=int), 1), 100)
+    entries, size = leaderboard.get_page(period, page, per_page)
+    rank, _ = leaderboard.get_rank(session['user_id'], period)
+    return jsonify({'period': period, 'page': page, 'total': size, 
+                    'your_rank': rank, 'entries': entries})
+
+@bp.route('/admin')
+def admin():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
+    
+    # Simple admin check
+    if session['username'] != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        questions = get_questions_with_stats()
+        recent_results, _ = get_results_page(limit=10)
+        return render_template('admin.html', questions=questions, results=recent_results,
+                             exams=get_exams(time.time()), archived=get_archive_summary())
+    except Exception as e:
+        flash('Error loading admin panel.', 'error')
+        print(f"Admin error: {e}")
+        return redirect(url_for('main.dashboard'))
+
+@bp.route('/add_question', methods=['POST'])
+def add_question_route():
+    if 'user_id' not in session or session['username'] != 'admin':
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        question = request.form['question']
+        option1 = request.form['option1']
+        option2 = request.form['option2']
+        option3 = request.form['option3']
+        option4 = request.form['option4']
+        correct_answer = int(request.form['correct_answer'])
+        difficulty = request.form['difficulty']
+        
+        add_question(question, option1, option2, option3, option4, correct_answer, difficulty)
+        flash('Question added successfully!', 'success')
+    except Exception as e:
+        flash('Error adding question. Please try again.', 'error')
+        print(f"Add question error: {e}")
+    
+    return redirect(url_for('main.admin'))
+
+@bp.route('/add_exam', methods=['POST'])
+def add_exam_route():
+    if 'user_id' not in session or session['username'] != 'admin':
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        title = request.form['title'].strip()
+        question_count = int(request.form['question_count'])
+        duration_seconds = int(float(request.form['duration_minutes']) * 60)
+        # datetime-local inputs are in the server's local time
+        starts_at = datetime.fromisoformat(request.form['starts_at']).timestamp()
+        ends_at = datetime.fromisoformat(request.form['ends_at']).timestamp()
+        
+        if not title or question_count < 1 or duration_seconds < 1 or ends_at <= starts_at:
+            flash('Please give a title, at least one question, a duration and an end after the start.', 'error')
+        else:
+            create_exam(title, question_count, duration_seconds, starts_at, ends_at)
+            flash('Exam scheduled successfully!', 'success')
+    except Exception as e:
+        flash('Error scheduling exam. Please try again.', 'error')
+        print(f"Add exam error: {e}")
+    
+    return redirect(url_for('main.admin'))
+
+@bp.route('/import_questions', methods=['POST'])
+def import_questions_route():
+    if 'user_id' not in session or session['username'] != 'admin':
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV or JSON file to import.', 'error')
+            return redirect(url_for('main.admin'))
+        
+        file_format = question_import.detect_format(upload.filename)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        summary = question_import.import_questions(stream, file_format)
+        
+        flash(f"Imported {summary['inserted']} questions "
+              f"({summary['duplicates']} duplicates skipped, {len(summary['rejected'])} rejected) "
+              f"at {summary['rows_per_second']:.0f} rows/s.", 'success')
+        for line_number, reason in summary['rejected'][:10]:
+            flash(f"Row {line_number}: {reason}", 'warning')
+    except Exception as e:
+        flash('Error importing questions. Please check the file and try again.', 'error')
+        print(f"Import questions error: {e}")
+    
+    return redirect(url_for('main.admin'))
+
+@bp.cli.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=question_import.BATCH_SIZE, show_default=True)
+def import_questions_command(path, batch_size):
+    """Bulk import questions from a CSV, JSON or NDJSON file."""
+    file_format = question_import.detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        summary = question_import.import_questions(stream, file_format, batch_size)
+    
+    print(f"Inserted {summary['inserted']} questions in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:.0f} rows/s)")
+    print(f"Skipped {summary['duplicates']} duplicates")
+    for line_number, reason in summary['rejected']:
+        print(f"Rejected row {line_number}: {reason}")
+
+@bp.cli.command('generate-questions')
+@click.argument('count', type=int)
+@click.option('--difficulty', type=click.Choice(question_generator.DIFFICULTIES))
+@click.option('--seed', type=int)
+def generate_questions_command(count, difficulty, seed):
+    """Generate COUNT arithmetic progression questions into the bank."""
+    records = question_generator.iter_records(count, difficulty, seed)
+    summary = question_import.import_records(records)
+    print(f"Generated and inserted {summary['inserted']} questions in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:.0f} rows/s)")
+    print(f"Skipped {summary['duplicates']} duplicates")
+
+@bp.cli.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--workers', type=int, help='Hashing processes (default PASSWORD_HASH_WORKERS).')
+@click.option('--credentials', type=click.Path(dir_okay=False, writable=True),
+              help='Write generated passwords to this CSV instead of printing them.')
+def provision_users_command(path, workers, credentials):
+    """Create accounts from a class roster CSV (username, email, password)."""
+    if workers:
+        passwords.HASH_WORKERS = workers
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        summary = user_import.import_roster(stream)
+    
+    print(f"Created {summary['inserted']} users in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:.0f} rows/s)")
+    print(f"Skipped {summary['duplicates']} existing usernames")
+    for line_number, reason in summary['rejected']:
+        print(f"Rejected row {line_number}: {reason}")
+    if summary['generated']:
+        if credentials:
+            with open(credentials, 'w', encoding='utf-8', newline='') as stream:
+                writer = csv.writer(stream)
+                writer.writerow(['username', 'password'])
+                writer.writerows(summary['generated'])
+            print(f"Wrote {len(summary['generated'])} generated passwords to {credentials}")
+        else:
+            print('Generated passwords:')
+            for username, password in summary['generated']:
+                print(f"{username},{password}")
+
+@bp.cli.command('archive-results')
+@click.option('--days', default=archive.MAX_AGE_DAYS, show_default=True,
+              help='Archive results older than this many days.')
+@click.option('--batch-size', default=archive.BATCH_SIZE, show_default=True)
+def archive_results_command(days, batch_size):
+    """Move old quiz results into the columnar archive."""
+    started = time.perf_counter()
+    count = archive.archive_results(max_age_days=days, batch_size=batch_size)
+    print(f"Archived {count} results older than {days} days in {time.perf_counter() - started:.2f}s "
+          f"to {archive.archive_dir()}")
+
+def parse_results_cursor(value):
+    """Decode a 'timestamp|id' page cursor from the query string"""
+    if not value:
+        return None
+    timestamp, _, result_id = value.rpartition('|')
+    return (timestamp, int(result_id))
+
+def format_results_cursor(cursor):
+    return f"{cursor[0]}|{cursor[1]}" if cursor else None
+
+@bp.route('/all_results')
+def all_results():
+    if 'user_id' not in session or session['username'] != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        cursor = parse_results_cursor(request.args.get('cursor'))
+        results, next_cursor = get_results_page(cursor, RESULTS_PAGE_SIZE)
+        return render_template('all_results.html', 
+                             results=results, 
+                             next_cursor=format_results_cursor(next_cursor),
+                             first_page=cursor is None)
+    except Exception as e:
+        flash('Error loading results.', 'error')
+        print(f"All results error: {e}")
+        return redirect(url_for('main.admin'))
+
+EXPORT_COLUMNS = ['id', 'username', 'email', 'score', 'total_questions', 
+                  'percentage', 'time_taken', 'timestamp']
+
+@bp.route('/export_results')
+def export_results():
+    if 'user_id' not in session or session['username'] != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        flash('Unsupported export format.', 'error')
+        return redirect(url_for('main.all_results'))
+    
+    def generate():
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            for row in iter_all_results():
+                writer.writerow([getattr(row, column) for column in EXPORT_COLUMNS])
+                if buffer.tell() > 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for row in iter_all_results():
+                yield json.dumps({column: getattr(row, column) for column in EXPORT_COLUMNS}) + '\n'
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"quiz_results.{export_format}"
+    return Response(stream_with_context(generate()), 
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/analytics')
+def analytics_page():
+    if 'user_id' not in session or session['username'] != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        # NumPy is only loaded once the report is first asked for
+        import analytics
+        return render_template('analytics.html', report=analytics.report())
+    except Exception as e:
+        flash('Error loading analytics.', 'error')
+        print(f"Analytics error: {e}")
+        return redirect(url_for('main.admin'))
+
+@bp.route('/export_analytics')
+def export_analytics():
+    if 'user_id' not in session or session['username'] != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    import analytics
+    return Response(json.dumps(analytics.report(all_students=True)),
+                    mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=quiz_analytics.json'})
+
+@bp.app_template_filter('datetime')
+def format_unix_time(value):
+    """Render a Unix time in the server's local time"""
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M')
+
+# Error handlers
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('404.html'), 404
+
+@bp.app_errorhandler(500)
+def internal_error(error):
+    return render_template('500.html'), 500
+
+def create_app(config=None):
+    """Application factory; config overrides the environment defaults"""
+    global attempt_store
+    started = time.perf_counter()
+    startup_timings.setdefault('import', started - IMPORT_STARTED)
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'arithmetic_quiz_secret_key_2025'),
+        DATABASE=os.environ.get('DATABASE', db.DATABASE),
+        # Serve the whole quiz in one page and submit once (falls back to /answer without JS)
+        QUIZ_CLIENT_MODE=os.environ.get('QUIZ_CLIENT_MODE', '1') == '1',
+        # 'memory' keeps attempts in this process; use 'sqlite' with more than one worker
+        QUIZ_STORE=os.environ.get('QUIZ_STORE', 'memory'),
+    )
+    if config:
+        app.config.update(config)
+    
+    db.DATABASE = app.config['DATABASE']
+    attempt_store = quiz_store.create_store(app.config['QUIZ_STORE'])
+    db.init_app(app)
+    metrics.init_app(app)
+    page_cache.init_app(app)
+    exams.init_app(app)
+    # Servers that skip prepare() still get the schema before the first
+    # request; once it is current this is a set lookup
+    app.before_request(init_db)
+    app.register_blueprint(bp)
+    startup_timings['create_app'] = time.perf_counter() - started
+    return app
+
+def prepare(app, force_init=False):
+    """One-time startup work: migrate and seed the database, load the leaderboard.
+
+    Run it once in the parent before worker processes are forked so they
+    share the loaded state and never race each other on migrations.
+    """
+    started = time.perf_counter()
+    init_db(force=force_init)
+    startup_timings['init_db'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    with app.app_context():
+        leaderboard.rebuild()
+    db.close_thread_connection()
+    startup_timings['leaderboard'] = time.perf_counter() - started
+    
+    for phase, seconds in startup_timings.items():
+        metrics.set_gauge('quiz_startup_seconds', seconds, phase=phase)
+    print("Startup: " + ", ".join(f"{phase} {seconds * 1000:.1f}ms"
+                                  for phase, seconds in startup_timings.items()))
+
+# Initialize database and start application
+if __name__ == '__main__':
+    print("Starting Arithmetic Progression Quiz Application...")
+    
+    try:
+        # Initialize database
+        print("Initializing database...")
+        app = create_app()
+        prepare(app)
+        
+        # Start the development server (see wsgi.py for production)
+        print("Starting Flask server...")
+        print("Server will be available at: http://127.0.0.1:5000")
+        app.run(host='127.0.0.1', port=5000, debug=True)
+        
+    except Exception as e:
+        print(f"Error starting application: {e}")
+        print("Please check if port 5000 is available or try a different port.")
@@ -0,0 +1,239 @@
+"""Columnar archive for old quiz_results rows.
+
+Each column lives in its own append-only file of fixed-width native values
+under archive_dir(). One archive run appends one segment per batch: the
+batch's rows sorted by user, newest first, so a user's rows in a segment
+are one contiguous slice. SQLite keeps where each segment and user slice
+starts (archive_segments, archive_user_ranges) plus the rollups, so
+readers memory-map the files and never read past committed rows.
+"""
+import heapq
+import mmap
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import dropwhile, islice
+import db
+
+# (quiz_results column, array typecode) in RESULT_COLUMNS order
+COLUMNS = (('id', 'q'), ('user_id', 'q'), ('score', 'i'), ('total_questions', 'i'),
+           ('percentage', 'd'), ('time_taken', 'i'), ('timestamp', 'q'))
+MAX_AGE_DAYS = int(os.environ.get('ARCHIVE_MAX_AGE_DAYS', '180'))
+BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '50000'))
+# Week and day leaderboards are rebuilt from quiz_results, so rows that can
+# still count towards them stay live
+MIN_AGE_DAYS = 8
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+_EPOCH = datetime(1970, 1, 1)
+
+_maps = {}   # column file path -> (mmap, typed memoryview)
+
+def archive_dir():
+    """RESULTS_ARCHIVE_DIR, or a directory next to the database"""
+    return os.environ.get('RESULTS_ARCHIVE_DIR') or os.path.splitext(db.DATABASE)[0] + '_archive'
+
+def to_epoch(timestamp):
+    return int((datetime.strptime(timestamp[:19], TIMESTAMP_FORMAT) - _EPOCH).total_seconds())
+
+def from_epoch(seconds):
+    return (_EPOCH + timedelta(seconds=seconds)).strftime(TIMESTAMP_FORMAT)
+
+def _column_path(name):
+    return os.path.join(archive_dir(), name + '.col')
+
+def _column(name, typecode, rows):
+    """Read-only typed view of a column file holding at least `rows` values"""
+    path = _column_path(name)
+    cached = _maps.get(path)
+    if cached is None or len(cached[1]) < rows:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Older maps are dropped, not closed: pages being read may still hold views of them
+        cached = _maps[path] = (mapped, memoryview(mapped).cast(typecode))
+    return cached[1]
+
+def _columns(rows):
+    return [_column(name, typecode, rows) for name, typecode in COLUMNS]
+
+def _row(columns, index):
+    row = [column[index] for column in columns]
+    row[-1] = from_epoch(row[-1])
+    return tuple(row)
+
+def _append(offset, rows):
+    """Write rows at row offset `offset` of every column file and fsync them.
+
+    Anything past offset was written by a run that never committed, so it
+    is cut off first.
+    """
+    os.makedirs(archive_dir(), exist_ok=True)
+    for index, (name, typecode) in enumerate(COLUMNS):
+        values = array(typecode, (row[index] for row in rows))
+        path = _column_path(name)
+        with open(path, 'ab') as f:
+            if f.tell() < offset * values.itemsize:
+                raise RuntimeError(f"Archive column {path} is missing committed rows")
+            f.truncate(offset * values.itemsize)
+            values.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+def _user_ranges(offset, rows):
+    """(user_id, start, count) for each user's slice of a sorted batch"""
+    ranges = []
+    for index, row in enumerate(rows):
+        if ranges and ranges[-1][0] == row[1]:
+            ranges[-1][2] += 1
+        else:
+            ranges.append([row[1], offset + index, 1])
+    return ranges
+
+def _rollups(rows):
+    users, days = {}, {}
+    for result_id, user_id, score, total, percentage, time_taken, timestamp in rows:
+        user = users.setdefault(user_id, [user_id, 0, 0.0, percentage, time_taken, timestamp, timestamp])
+        user[1] += 1
+        user[2] += percentage
+        if (-percentage, time_taken) < (-user[3], user[4]):
+            user[3], user[4] = percentage, time_taken
+        user[5] = min(user[5], timestamp)
+        user[6] = max(user[6], timestamp)
+        day = days.setdefault(timestamp[:10], [timestamp[:10], 0, 0.0, 0])
+        day[1] += 1
+        day[2] += percentage
+        day[3] += time_taken
+    return list(users.values()), list(days.values())
+
+def _archive_batch(conn, cutoff, batch_size):
+    if conn.in_transaction:
+        conn.commit()
+    # Held until the commit so only one archiver appends at a time
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute('''
+            SELECT id, user_id, score, total_questions, percentage, time_taken, timestamp
+            FROM quiz_results
+            WHERE timestamp < ?
+            ORDER BY timestamp, id
+            LIMIT ?
+        ''', (cutoff, batch_size)).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+        rows = [tuple(row) for row in rows]
+        rows.sort(key=lambda row: (row[6], row[0]), reverse=True)
+        rows.sort(key=lambda row: row[1])
+        offset = conn.execute('SELECT COALESCE(MAX(start + rows), 0) FROM archive_segments').fetchone()[0]
+        _append(offset, [row[:6] + (to_epoch(row[6]),) for row in rows])
+
+        segment_id = conn.execute('''
+            INSERT INTO archive_segments (start, rows, first_timestamp, last_timestamp)
+            VALUES (?, ?, ?, ?)
+        ''', (offset, len(rows), min(row[6] for row in rows), max(row[6] for row in rows))).lastrowid
+        conn.executemany('''
+            INSERT INTO archive_user_ranges (user_id, segment_id, start, rows)
+            VALUES (?, ?, ?, ?)
+        ''', [(user_id, segment_id, start, count) for user_id, start, count in _user_ranges(offset, rows)])
+        users, days = _rollups(rows)
+        conn.executemany('''
+            INSERT INTO archive_user_rollups
+                (user_id, attempts, percentage_sum, best_percentage, best_time_taken,
+                 first_timestamp, last_timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                percentage_sum = percentage_sum + excluded.percentage_sum,
+                best_time_taken = CASE
+                    WHEN excluded.best_percentage > best_percentage THEN excluded.best_time_taken
+                    WHEN excluded.best_percentage = best_percentage
+                        THEN MIN(best_time_taken, excluded.best_time_taken)
+                    ELSE best_time_taken END,
+                best_percentage = MAX(best_percentage, excluded.best_percentage),
+                first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+                last_timestamp = MAX(last_timestamp, excluded.last_timestamp)
+        ''', users)
+        conn.executemany('''
+            INSERT INTO archive_daily_rollups (day, attempts, percentage_sum, total_time)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (day) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                percentage_sum = percentage_sum + excluded.percentage_sum,
+                total_time = total_time + excluded.total_time
+        ''', days)
+        conn.executemany('DELETE FROM quiz_results WHERE id = ?', [(row[0],) for row in rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+def archive_results(conn=None, max_age_days=MAX_AGE_DAYS, batch_size=BATCH_SIZE, now=None):
+    """Move results older than max_age_days out of quiz_results into the archive.
+
+    Each batch is appended as one segment and committed in its own
+    transaction together with the rollups and the delete, so an interrupted
+    run loses nothing. user_stats already counts these attempts and is left
+    alone. Returns the number of results archived.
+    """
+    if max_age_days < MIN_AGE_DAYS:
+        raise ValueError(f"Results younger than {MIN_AGE_DAYS} days cannot be archived")
+    conn = conn or db.get_db_connection()
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=max_age_days)).strftime(TIMESTAMP_FORMAT)
+    archived = 0
+    while True:
+        count = _archive_batch(conn, cutoff, batch_size)
+        archived += count
+        if count < batch_size:
+            return archived
+
+def user_results(conn, user_id, before=None, limit=None):
+    """A user's archived results newest first, as RESULT_COLUMNS tuples.
+
+    before is a (timestamp, id) cursor; only older rows are returned.
+    """
+    ranges = conn.execute(
+        'SELECT start, rows FROM archive_user_ranges WHERE user_id = ?', (user_id,)).fetchall()
+    if not ranges:
+        return []
+    columns = _columns(max(start + rows for start, rows in ranges))
+    ids, timestamps = columns[0], columns[-1]
+    # Every slice is sorted newest first; merge them across segments
+    merged = heapq.merge(*[((timestamps[i], ids[i], i) for i in range(start, start + rows))
+                           for start, rows in ranges], reverse=True)
+    if before:
+        key = (to_epoch(before[0]), before[1])
+        merged = dropwhile(lambda entry: entry[:2] >= key, merged)
+    return [_row(columns, entry[2]) for entry in islice(merged, limit)]
+
+def iter_results(conn):
+    """Every archived result, newest segment first and newest first within it"""
+    segments = conn.execute('SELECT start, rows FROM archive_segments ORDER BY id DESC').fetchall()
+    if not segments:
+        return
+    columns = _columns(max(start + rows for start, rows in segments))
+    ids, timestamps = columns[0], columns[-1]
+    for start, rows in segments:
+        order = sorted(range(start, start + rows), key=lambda i: (timestamps[i], ids[i]), reverse=True)
+        for index in order:
+            yield _row(columns, index)
+
+def committed_columns(conn):
+    """Every archived row as {column: typed view}, unordered; empty if nothing is archived.
+
+    Pass a connection inside a read transaction to get views that match
+    the quiz_results rows it sees.
+    """
+    rows = conn.execute('SELECT COALESCE(MAX(start + rows), 0) FROM archive_segments').fetchone()[0]
+    if not rows:
+        return {}
+    return {name: view[:rows] for (name, _), view in zip(COLUMNS, _columns(rows))}
+
+def summary(conn):
+    """Totals for the admin page"""
+    row = conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(rows), 0), MIN(first_timestamp), MAX(last_timestamp)
+        FROM archive_segments
+    ''').fetchone()
+    return {'segments': row[0], 'results': row[1], 'oldest': row[2], 'newest': row[3]}
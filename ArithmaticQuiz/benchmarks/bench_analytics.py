@@ -0,0 +1,60 @@
+"""Time the cohort analytics report: the first full load, then an incremental refresh.
+
+Usage: python benchmarks/bench_analytics.py [--rows 1000000] [--users 5000] [--new 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import migrations
+
+def seed(conn, rows, users):
+    def result_rows():
+        for _ in range(rows):
+            score = random.randint(0, 10)
+            yield (random.randint(1, users), score, 10, score * 10.0, random.randint(30, 600))
+
+    conn.executemany('''
+        INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken)
+        VALUES (?, ?, ?, ?, ?)
+    ''', result_rows())
+    conn.commit()
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{label:<28}{(time.perf_counter() - start) * 1000:>9.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--new', type=int, default=1000)
+    args = parser.parse_args()
+
+    db.DATABASE = os.path.join(tempfile.mkdtemp(prefix='quiz-analytics-'), 'quiz.db')
+    conn = db.get_db_connection()
+    migrations.migrate(conn)
+    conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                     ((f'user{i}', f'user{i}@example.com', 'x') for i in range(args.users)))
+    timed(f'seed {args.rows} results', lambda: seed(conn, args.rows, args.users))
+
+    import analytics
+    analytics.REFRESH_INTERVAL = 0
+    report = timed('first report (full load)', analytics.report)
+    timed('report, nothing new', analytics.report)
+    seed(conn, args.new, args.users)
+    timed(f'report after {args.new} new', analytics.report)
+    timed('export (every student)', lambda: analytics.report(all_students=True))
+    print(f"\n{report['results']} results, median {report['percentage']['percentiles']['p50']:.0f}%, "
+          f"{report['trends']['improving']} of {report['trends']['students']} students improving")
+
+if __name__ == '__main__':
+    main()
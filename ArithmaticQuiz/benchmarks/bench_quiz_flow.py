@@ -0,0 +1,212 @@
+"""Load-test the quiz request lifecycle and report latency per route.
+
+Each simulated user registers, logs in, opens the dashboard, takes a quiz
+and views the result. By default requests go through Flask's test client
+against a freshly seeded database; pass --url to drive a running server
+(for example a multi-worker WSGI deployment) over HTTP instead.
+
+Usage:
+    python benchmarks/bench_quiz_flow.py --users 50 --concurrency 10
+    python benchmarks/bench_quiz_flow.py --mode client --questions 20000 --results 100000
+    python benchmarks/bench_quiz_flow.py --url http://127.0.0.1:8000 --users 200 --concurrency 32
+    python benchmarks/bench_quiz_flow.py --save baseline.json
+    python benchmarks/bench_quiz_flow.py --baseline baseline.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUIZ_LENGTH = 10
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        response = self.client.open(path, method=method, data=data, json=json_body)
+        response.close()
+        return response.status_code
+
+class HTTPDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None, json_body=None):
+        body, headers = None, {}
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class Recorder:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, driver, route, method, path, expect=(200, 302), **kwargs):
+        start = time.perf_counter()
+        status = driver.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.timings[route].append(elapsed)
+            if status not in expect:
+                self.errors[route] += 1
+        return status
+
+def simulate_user(make_driver, recorder, index, mode):
+    driver = make_driver()
+    username = f"bench_{os.getpid()}_{index}_{random.randrange(1 << 30)}"
+    password = 'bench-password'
+    recorder.call(driver, 'POST /register', 'POST', '/register', data={
+        'username': username, 'email': f'{username}@example.com',
+        'password': password, 'confirm_password': password})
+    recorder.call(driver, 'POST /login', 'POST', '/login',
+                  data={'username': username, 'password': password})
+    recorder.call(driver, 'GET /dashboard', 'GET', '/dashboard')
+
+    if mode == 'client':
+        recorder.call(driver, 'GET /quiz', 'GET', '/quiz')
+        recorder.call(driver, 'POST /api/quiz/submit', 'POST', '/api/quiz/submit',
+                      json_body={'answers': [random.randint(1, 4) for _ in range(QUIZ_LENGTH)]})
+    else:
+        recorder.call(driver, 'GET /quiz', 'GET', '/quiz?client=0')
+        for _ in range(QUIZ_LENGTH):
+            recorder.call(driver, 'POST /answer', 'POST', '/answer',
+                          data={'answer': str(random.randint(1, 4))})
+    recorder.call(driver, 'GET /result', 'GET', '/result')
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(recorder, wall_time):
+    summary = {}
+    for route, timings in recorder.timings.items():
+        timings = sorted(timings)
+        summary[route] = {
+            'count': len(timings),
+            'errors': recorder.errors[route],
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'rps': len(timings) / wall_time
+        }
+    return summary
+
+def print_report(summary, wall_time, baseline=None):
+    total = sum(route['count'] for route in summary.values())
+    print(f"\n{total} requests in {wall_time:.2f}s ({total / wall_time:.1f} req/s)\n")
+    header = f"{'route':<24}{'count':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+    if baseline:
+        header += f"{'p50 vs base':>13}"
+    print(header)
+    for route in sorted(summary):
+        row = summary[route]
+        line = (f"{route:<24}{row['count']:>7}{row['errors']:>7}{row['p50_ms']:>10.2f}"
+                f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['rps']:>9.1f}")
+        if baseline and route in baseline:
+            base = baseline[route]['p50_ms']
+            line += f"{(row['p50_ms'] - base) / base * 100 if base else 0:>+12.1f}%"
+        print(line)
+
+def seed_database(questions, results):
+    """Create and seed a throwaway database, returning the Flask app bound to it"""
+    import db
+    work_dir = tempfile.mkdtemp(prefix='quiz-bench-')
+    db.DATABASE = os.path.join(work_dir, 'quiz.db')
+    import app as quiz_app
+    app = quiz_app.create_app()
+    quiz_app.prepare(app)
+
+    if questions:
+        import question_generator
+        import question_import
+        summary = question_import.import_records(question_generator.iter_records(questions, seed=1))
+        print(f"Seeded {summary['inserted']} generated questions")
+    if results:
+        conn = db.connect()
+        conn.executemany('''
+            INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken)
+            VALUES (1, ?, 10, ?, ?)
+        ''', ((score, score * 10.0, random.randint(30, 600))
+              for score in (random.randint(0, 10) for _ in range(results))))
+        conn.commit()
+        conn.close()
+        print(f"Seeded {results} quiz results")
+    db.close_thread_connection()
+    print(f"Database: {db.DATABASE}")
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='simulated users in total')
+    parser.add_argument('--concurrency', type=int, default=8, help='users running at once')
+    parser.add_argument('--mode', choices=('server', 'client'), default='server',
+                        help='server: one POST /answer per question; client: single API submit')
+    parser.add_argument('--questions', type=int, default=0, help='extra generated questions to seed')
+    parser.add_argument('--results', type=int, default=0, help='historical results to seed')
+    parser.add_argument('--url', help='drive a running server instead of the test client')
+    parser.add_argument('--save', help='write the summary as JSON for use as a baseline')
+    parser.add_argument('--baseline', help='compare p50 latency against a saved summary')
+    args = parser.parse_args()
+
+    if args.url:
+        make_driver = lambda: HTTPDriver(args.url)
+    else:
+        app = seed_database(args.questions, args.results)
+        make_driver = lambda: TestClientDriver(app)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(simulate_user, make_driver, recorder, i, args.mode)
+                   for i in range(args.users)]
+        for future in futures:
+            future.result()
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(recorder, wall_time)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(summary, wall_time, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved summary to {args.save}")
+
+if __name__ == '__main__':
+    main()
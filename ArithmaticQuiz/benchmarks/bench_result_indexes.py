@@ -0,0 +1,88 @@
+"""Compare dashboard/admin result queries before and after the result indexes.
+
+Usage: python benchmarks/bench_result_indexes.py [--rows 1000000] [--users 5000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+
+USER_RESULTS_SQL = '''
+    SELECT * FROM quiz_results
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+'''
+ALL_RESULTS_SQL = '''
+    SELECT qr.*, u.username, u.email
+    FROM quiz_results qr
+    JOIN users u ON qr.user_id = u.id
+    ORDER BY qr.timestamp DESC
+    LIMIT 50
+'''
+
+def seed(conn, rows, users):
+    migrations._baseline(conn)
+    conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                     ((f'user{i}', f'user{i}@example.com', 'x') for i in range(users)))
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+
+    def result_rows():
+        for _ in range(rows):
+            score = random.randint(0, 10)
+            ts = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + random.randint(0, 365 * 86400)))
+            yield (random.randint(1, users), score, 10, score * 10.0, random.randint(30, 600), ts)
+
+    conn.executemany('''
+        INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', result_rows())
+    conn.commit()
+
+def plan(conn, sql, params=()):
+    return '; '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+def timed(conn, sql, params_list):
+    timings = []
+    for params in params_list:
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+def report(conn, label, users, samples):
+    user_params = [(random.randint(1, users),) for _ in range(samples)]
+    print(f"\n[{label}]")
+    print(f"  user results plan: {plan(conn, USER_RESULTS_SQL, (1,))}")
+    print(f"  user results p50:  {timed(conn, USER_RESULTS_SQL, user_params):.2f} ms")
+    print(f"  all results plan:  {plan(conn, ALL_RESULTS_SQL)}")
+    print(f"  all results p50:   {timed(conn, ALL_RESULTS_SQL, [()] * samples):.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        print(f"Seeding {args.rows} results for {args.users} users...")
+        seed(conn, args.rows, args.users)
+        report(conn, 'before migrations', args.users, args.samples)
+
+        start = time.perf_counter()
+        migrations.migrate(conn)
+        print(f"\nmigrate() took {time.perf_counter() - start:.2f} s")
+        report(conn, 'after migrations', args.users, args.samples)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
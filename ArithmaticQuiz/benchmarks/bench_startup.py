@@ -0,0 +1,80 @@
+"""Measure cold-start time from interpreter launch to the first response.
+
+Each run is a fresh Python process that imports the app, builds it,
+runs prepare() and serves GET /login through the test client, so the
+numbers are what a newly spawned worker pays. Three scenarios are timed:
+
+    fresh    a new empty database every run (migrations and seeding)
+    current  a database already at the current schema version (fast path)
+    forced   the current database with init_db(force=True), i.e. the full
+             migrate-and-seed checks every start used to do
+
+Usage: python benchmarks/bench_startup.py [--runs 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import db
+db.DATABASE = {database!r}
+import app as quiz_app
+imported = time.perf_counter()
+application = quiz_app.create_app({{'EXAM_SCHEDULER': False}})
+quiz_app.prepare(application, force_init={force})
+prepared = time.perf_counter()
+response = application.test_client().get('/login')
+assert response.status_code == 200, response.status_code
+responded = time.perf_counter()
+print(json.dumps({{
+    'import': imported - started,
+    'create_app + prepare': prepared - imported,
+    'first response': responded - prepared,
+    'import to first response': responded - started,
+}}))
+'''
+
+def run_once(database, force=False):
+    code = CHILD.format(root=ROOT, database=database, force=force)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process wall time'] = wall
+    return timings
+
+def report(name, runs):
+    print(f"\n{name} ({len(runs)} runs, median ms)")
+    for phase in runs[0]:
+        print(f"  {phase:<28}{statistics.median(run[phase] for run in runs) * 1000:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='quiz-startup-')
+    fresh = [run_once(os.path.join(work_dir, f'fresh-{i}.db')) for i in range(args.runs)]
+
+    database = os.path.join(work_dir, 'current.db')
+    run_once(database)
+    current = [run_once(database) for _ in range(args.runs)]
+    forced = [run_once(database, force=True) for _ in range(args.runs)]
+
+    report('fresh', fresh)
+    report('current', current)
+    report('forced', forced)
+
+if __name__ == '__main__':
+    main()
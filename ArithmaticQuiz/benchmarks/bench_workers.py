@@ -0,0 +1,87 @@
+"""Measure quiz throughput under gunicorn as the number of workers grows.
+
+For each worker count a fresh gunicorn (gunicorn.conf.py) is started on a
+seeded throwaway database and driven over HTTP with the bench_quiz_flow
+user journey. Run it on the machine you deploy to; the useful maximum is
+usually close to the number of cores.
+
+Usage:
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --users 200 --concurrency 32
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_quiz_flow import HTTPDriver, Recorder, simulate_user
+
+def wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(url + '/login').close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+def run(workers, args):
+    work_dir = tempfile.mkdtemp(prefix='quiz-workers-')
+    url = f'http://127.0.0.1:{args.port}'
+    env = dict(os.environ,
+               DATABASE=os.path.join(work_dir, 'quiz.db'),
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(args.threads),
+               BIND=f'127.0.0.1:{args.port}')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(url, process)
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(simulate_user, lambda: HTTPDriver(url), recorder, i, args.mode)
+                       for i in range(args.users)]
+            for future in futures:
+                future.result()
+        wall_time = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    requests = sum(len(timings) for timings in recorder.timings.values())
+    errors = sum(recorder.errors.values())
+    return requests / wall_time, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mode', choices=('server', 'client'), default='client')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.threads} threads per worker, "
+          f"{args.users} users at concurrency {args.concurrency} ({args.mode} mode)\n")
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>10}{'errors':>8}")
+    base = None
+    for workers in args.workers:
+        rps, errors = run(workers, args)
+        base = base or rps
+        print(f"{workers:>8}{rps:>10.1f}{rps / base:>9.2f}x{errors:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import sqlite3
+import threading
+from flask import g, has_app_context
+
+DATABASE = 'quiz.db'
+
+# Connection tuning applied once when a connection is opened
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+# Swapped for an instrumented subclass by metrics.init_app()
+connection_factory = sqlite3.Connection
+
+_local = threading.local()
+
+def connect(database=None):
+    """Open a new tuned SQLite connection (caller owns and closes it)"""
+    conn = sqlite3.connect(database or DATABASE,
+                           timeout=BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False,
+                           factory=connection_factory)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    return conn
+
+def get_db_connection():
+    """Return the shared connection for the current request or thread.
+
+    Inside a Flask app context the connection lives on ``g`` and is closed
+    by close_db() at teardown. Outside one (CLI, scripts) each thread keeps
+    a single long-lived connection. Callers must not close it.
+    """
+    if has_app_context():
+        if '_database' not in g:
+            g._database = connect()
+        return g._database
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+def close_db(exception=None):
+    """Release the request connection, rolling back anything left uncommitted"""
+    conn = g.pop('_database', None)
+    if conn is not None:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+
+def close_thread_connection():
+    """Close the calling thread's out-of-request connection, if any"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
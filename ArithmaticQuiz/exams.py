@@ -0,0 +1,177 @@
+import atexit
+import json
+import os
+import threading
+import time
+import db
+import leaderboard
+import metrics
+import result_writer
+from models import answer_rows, get_questions_by_ids
+from quiz_store import ExamAttemptStore
+
+SWEEP_INTERVAL = float(os.environ.get('EXAM_SWEEP_INTERVAL', '1'))
+FINALIZE_BATCH = int(os.environ.get('EXAM_FINALIZE_BATCH', '500'))
+# Answers this late are still accepted, to allow for the request in flight
+GRACE_SECONDS = float(os.environ.get('EXAM_GRACE_SECONDS', '2'))
+
+# Exam attempts always live in SQLite so every worker's scheduler can see them
+store = ExamAttemptStore()
+
+_thread = None
+_thread_pid = None
+_start_lock = threading.Lock()
+_stop = threading.Event()
+
+def is_open(exam, now):
+    return exam.starts_at <= now < exam.ends_at
+
+def deadline_for(exam, now):
+    """An attempt gets the exam's full duration, but never runs past the window"""
+    return min(now + exam.duration_seconds, exam.ends_at)
+
+def timed_out(attempt, now=None):
+    deadline = attempt.get('deadline')
+    return deadline is not None and (now or time.time()) > deadline + GRACE_SECONDS
+
+def _finish(attempt_id, attempt, end_time, timed_out, timestamp):
+    """Set attempt['result'] and return its write_results() entry.
+
+    Unanswered questions count as wrong.
+    """
+    total = len(attempt['question_ids'])
+    answered = attempt['question_ids'][:len(attempt['answers'])]
+    attempt['result'] = {
+        'score': attempt['score'],
+        'total': total,
+        'percentage': attempt['score'] / total * 100,
+        'time_taken': int(max(0, end_time - attempt['start_time'])),
+        'timed_out': timed_out
+    }
+    return ((attempt['user_id'], attempt['score'], total, attempt['result']['percentage'],
+             attempt['result']['time_taken'], timestamp),
+            answer_rows(attempt_id, get_questions_by_ids(answered), attempt['answers'],
+                        attempt.get('response_ms', [])),
+            attempt['question_ids'])
+
+def _recorded(finished, timestamp):
+    """Update the in-process views once the results are committed"""
+    for attempt in finished:
+        result = attempt['result']
+        leaderboard.record(attempt['user_id'], result['percentage'], result['time_taken'], timestamp)
+
+def finalize(conn, attempt_id, attempt, now=None):
+    """Save a submitted exam attempt's result and return it.
+
+    Claiming the attempt, writing the result and storing the finished
+    attempt happen in one transaction. Returns None if the scheduler or
+    another request already finalised it.
+    """
+    now = now or time.time()
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        claimed = conn.execute('UPDATE quiz_attempts SET deadline = NULL WHERE id = ? AND deadline IS NOT NULL',
+                               (attempt_id,)).rowcount
+        if not claimed:
+            conn.rollback()
+            return None
+        timestamp = result_writer.timestamp()
+        entry = _finish(attempt_id, attempt, min(now, attempt['deadline']), now > attempt['deadline'], timestamp)
+        result_writer.write_results(conn, [entry])
+        conn.execute('UPDATE quiz_attempts SET data = ? WHERE id = ?',
+                     (json.dumps(attempt, separators=(',', ':')), attempt_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    _recorded([attempt], timestamp)
+    return attempt['result']
+
+def finalize_expired(conn, now=None, batch_size=FINALIZE_BATCH):
+    """Score up to batch_size attempts past their deadline and save them in one transaction.
+
+    Clearing the deadline in the same transaction claims each attempt, so
+    concurrent schedulers and /result requests never record it twice.
+    Returns the number finalised.
+    """
+    now = now or time.time()
+    finished = []
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute('''
+            SELECT id, data, deadline FROM quiz_attempts
+            WHERE deadline IS NOT NULL AND deadline <= ?
+            ORDER BY deadline
+            LIMIT ?
+        ''', (now - GRACE_SECONDS, batch_size)).fetchall()
+        timestamp = result_writer.timestamp()
+        entries, updates = [], []
+        for attempt_id, data, deadline in rows:
+            attempt = json.loads(data)
+            entries.append(_finish(attempt_id, attempt, deadline, True, timestamp))
+            updates.append((json.dumps(attempt, separators=(',', ':')), attempt_id))
+            finished.append(attempt)
+        if entries:
+            result_writer.write_results(conn, entries)
+            conn.executemany('UPDATE quiz_attempts SET data = ?, deadline = NULL WHERE id = ?', updates)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    _recorded(finished, timestamp)
+    if finished:
+        metrics.inc('quiz_exam_auto_finalized_total', len(finished))
+        metrics.observe('quiz_exam_finalize_batch_size', len(finished), (1, 10, 50, 100, 250, 500, 1000))
+    return len(finished)
+
+def attempt_states(user_id, now=None):
+    """exam id -> True if the user's attempt at it is still running, False once it is over"""
+    now = now or time.time()
+    rows = db.get_db_connection().execute('''
+        SELECT e.exam_id, a.deadline
+        FROM exam_attempts e
+        LEFT JOIN quiz_attempts a ON a.id = e.attempt_id
+        WHERE e.user_id = ?
+    ''', (user_id,)).fetchall()
+    return {exam_id: deadline is not None and now <= deadline + GRACE_SECONDS for exam_id, deadline in rows}
+
+def _run():
+    while not _stop.wait(SWEEP_INTERVAL):
+        try:
+            # Keep going while batches come back full, e.g. when an exam window closes
+            while finalize_expired(db.get_db_connection()) == FINALIZE_BATCH:
+                pass
+        except Exception as e:
+            print(f"Exam scheduler error: {e}")
+    db.close_thread_connection()
+
+def ensure_started():
+    """Start this process's scheduler thread, again after a fork"""
+    global _thread, _thread_pid
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        return
+    with _start_lock:
+        if _thread is None or _thread_pid != os.getpid() or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='exam-scheduler', daemon=True)
+            _thread_pid = os.getpid()
+            _thread.start()
+
+def shutdown():
+    _stop.set()
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        _thread.join(timeout=5)
+
+def init_app(app):
+    """Run the scheduler in every serving process unless EXAM_SCHEDULER=0"""
+    app.config.setdefault('EXAM_SCHEDULER', os.environ.get('EXAM_SCHEDULER', '1') == '1')
+    if app.config['EXAM_SCHEDULER']:
+        app.before_request(ensure_started)
+
+atexit.register(shutdown)
+metrics.describe('quiz_exam_auto_finalized_total', 'Exam attempts finalised by the scheduler at their deadline')
+metrics.describe('quiz_exam_finalize_batch_size', 'Expired exam attempts finalised per transaction')
@@ -0,0 +1,27 @@
+"""gunicorn settings for serving the quiz from several processes on one SQLite file.
+
+Every worker opens its own connections after the fork. SQLite in WAL mode
+lets the workers read concurrently while writes (results, registrations)
+take turns on the write lock, waiting up to db.BUSY_TIMEOUT_MS.
+"""
+import os
+
+# Attempts must be visible to whichever worker serves the next request
+os.environ.setdefault('QUIZ_STORE', 'sqlite')
+# One hashing process per worker keeps logins from oversubscribing the cores
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+# One process per core; the threads overlap SQLite and password hashing waits
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+def post_fork(server, worker):
+    # Nothing opened by the master (connections, pools, writer threads) may be reused
+    import db
+    db.close_thread_connection()
@@ -0,0 +1,184 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from db import get_db_connection
+
+PERIODS = ('global', 'week', 'day')
+# How often a worker folds in results saved by other processes
+REFRESH_INTERVAL = 5
+
+class Board:
+    """Each user's best attempt, kept sorted by (-percentage, time_taken, user_id)"""
+    __slots__ = ('keys', 'best')
+
+    def __init__(self):
+        self.keys = []
+        self.best = {}
+
+    def offer(self, user_id, percentage, time_taken):
+        key = (-percentage, time_taken, user_id)
+        old = self.best.get(user_id)
+        if old is not None:
+            if old <= key:
+                return False
+            del self.keys[bisect_left(self.keys, old)]
+        insort(self.keys, key)
+        self.best[user_id] = key
+        return True
+
+    def rank(self, user_id):
+        """1-based rank; users with the same score and time share a rank"""
+        key = self.best.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self.keys, key[:2]) + 1
+
+    def page(self, offset, limit):
+        return [(bisect_left(self.keys, key[:2]) + 1, key) for key in self.keys[offset:offset + limit]]
+
+    def __len__(self):
+        return len(self.keys)
+
+_lock = threading.Lock()
+_boards = {}          # (period, period key) -> Board
+_last_result_id = 0
+_last_refresh = 0.0
+_loaded = False
+
+def _current():
+    """(first day of the current ISO week, week key, day key), in UTC"""
+    now = datetime.now(timezone.utc)
+    year, week, weekday = now.isocalendar()
+    week_start = (now - timedelta(days=weekday - 1)).strftime('%Y-%m-%d')
+    return week_start, f'{year}-W{week:02d}', now.strftime('%Y-%m-%d')
+
+def current_key(period):
+    _, week, day = _current()
+    return {'global': '', 'week': week, 'day': day}[period]
+
+def _get(key):
+    board = _boards.get(key)
+    if board is None:
+        board = _boards[key] = Board()
+    return board
+
+def _offer(user_id, percentage, time_taken, timestamp, current):
+    """Apply an attempt at timestamp ('YYYY-MM-DD HH:MM:SS', UTC); current is _current()"""
+    week_start, week, day = current
+    _get(('global', '')).offer(user_id, percentage, time_taken)
+    # Only the current week and day are kept in memory
+    if timestamp >= week_start:
+        _get(('week', week)).offer(user_id, percentage, time_taken)
+        if timestamp.startswith(day):
+            _get(('day', day)).offer(user_id, percentage, time_taken)
+
+def _prune(current):
+    _, week, day = current
+    keep = {('global', ''), ('week', week), ('day', day)}
+    for key in list(_boards):
+        if key not in keep:
+            del _boards[key]
+
+def _load(conn, current):
+    """Startup load: each user's best from SQL for the global board, plus this week's rows"""
+    global _last_result_id
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM quiz_results').fetchone()[0]
+    board = _get(('global', ''))
+    # Archived attempts are older than any week or day board, so their
+    # per-user bests only count towards the global one
+    for user_id, percentage, time_taken in conn.execute(
+            'SELECT user_id, best_percentage, best_time_taken FROM archive_user_rollups'):
+        board.offer(user_id, percentage, time_taken)
+    # Best percentage first, then the fastest attempt at that percentage
+    for user_id, percentage, time_taken in conn.execute('''
+        SELECT r.user_id, r.percentage, MIN(r.time_taken)
+        FROM quiz_results r
+        JOIN (
+            SELECT user_id, MAX(percentage) AS best_percentage
+            FROM quiz_results
+            WHERE id <= ?
+            GROUP BY user_id
+        ) b ON b.user_id = r.user_id AND r.percentage = b.best_percentage
+        WHERE r.id <= ?
+        GROUP BY r.user_id
+    ''', (last_id, last_id)):
+        board.offer(user_id, percentage, time_taken)
+    for user_id, percentage, time_taken, timestamp in conn.execute('''
+        SELECT user_id, percentage, time_taken, timestamp
+        FROM quiz_results
+        WHERE timestamp >= ? AND id <= ?
+    ''', (current[0], last_id)):
+        _offer(user_id, percentage, time_taken, timestamp, current)
+    _last_result_id = last_id
+
+def refresh(force=False):
+    """Fold in quiz_results rows added since the last load (everything at startup)"""
+    global _last_result_id, _last_refresh, _loaded
+    if not force and _loaded and time.monotonic() - _last_refresh < REFRESH_INTERVAL:
+        return
+    with _lock:
+        conn = get_db_connection()
+        current = _current()
+        if not _loaded:
+            _load(conn, current)
+        rows = conn.execute('''
+            SELECT id, user_id, percentage, time_taken, timestamp
+            FROM quiz_results
+            WHERE id > ?
+            ORDER BY id
+        ''', (_last_result_id,))
+        for result_id, user_id, percentage, time_taken, timestamp in rows:
+            _offer(user_id, percentage, time_taken, timestamp, current)
+            _last_result_id = result_id
+        _prune(current)
+        _last_refresh = time.monotonic()
+        _loaded = True
+
+def rebuild():
+    global _last_result_id, _loaded
+    with _lock:
+        _boards.clear()
+        _last_result_id = 0
+        _loaded = False
+    refresh(force=True)
+
+def record(user_id, percentage, time_taken, timestamp):
+    """Apply a just-saved result without waiting for the next refresh"""
+    with _lock:
+        _offer(user_id, percentage, time_taken, timestamp, _current())
+
+def _board(period):
+    refresh()
+    return _boards.get((period, current_key(period)))
+
+def get_rank(user_id, period='global'):
+    """Return (rank, board size) for a user, rank None if they have no attempt"""
+    board = _board(period)
+    if board is None:
+        return None, 0
+    with _lock:
+        return board.rank(user_id), len(board)
+
+def get_page(period='global', page=1, per_page=20):
+    """Top-N page of a board as dicts with rank, username, percentage and time"""
+    board = _board(period)
+    if board is None:
+        return [], 0
+    with _lock:
+        entries = board.page((page - 1) * per_page, per_page)
+        size = len(board)
+    if not entries:
+        return [], size
+
+    user_ids = [key[2] for _, key in entries]
+    placeholders = ','.join('?' * len(user_ids))
+    names = dict(get_db_connection().execute(
+        f'SELECT id, username FROM users WHERE id IN ({placeholders})', user_ids).fetchall())
+    return [{
+        'rank': rank,
+        'user_id': key[2],
+        'username': names.get(key[2], '?'),
+        'percentage': -key[0],
+        'time_taken': key[1]
+    } for rank, key in entries], size
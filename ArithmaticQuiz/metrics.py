@@ -0,0 +1,257 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request, session, template_rendered, before_render_template
+import db
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+COOKIE_BYTES_BUCKETS = (128, 256, 512, 1024, 2048, 3072, 4096)
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_gauges = {}       # (name, labels) -> callable or value
+_histograms = {}   # (name, labels) -> [bucket counts, sum, count, buckets]
+_help = {}
+
+enabled = False
+slow_request_seconds = None
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+def describe(name, text):
+    _help[name] = text
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to a value, or to a zero-argument callable read at scrape time"""
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0, buckets]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def render():
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items(), key=lambda item: item[0])
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        histograms = [(key, (list(h[0]), h[1], h[2], h[3])) for key, h in histograms]
+
+    for (name, labels), value in counters:
+        header(name, 'counter')
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        header(name, 'gauge')
+        lines.append(f"{name}{_format_labels(labels)} {value() if callable(value) else value}")
+    for (name, labels), (counts, total, count, buckets) in histograms:
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+# SQL instrumentation
+
+_whitespace = re.compile(r'\s+')
+
+def statement_label(sql):
+    """Collapse whitespace so the same statement always gets the same label"""
+    return _whitespace.sub(' ', sql).strip()[:120]
+
+def _request_stats():
+    if has_request_context():
+        return g.get('_sql_stats')
+    return None
+
+def _record_sql(sql, elapsed):
+    stats = _request_stats()
+    if stats is not None:
+        label = statement_label(sql)
+        count, total = stats['statements'].get(label, (0, 0.0))
+        stats['statements'][label] = (count + 1, total + elapsed)
+        stats['queries'] += 1
+        stats['seconds'] += elapsed
+
+def _record_rows(rows):
+    stats = _request_stats()
+    if stats is not None:
+        stats['rows'] += rows
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _record_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _record_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        _record_rows(1)
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Request hooks
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('_template_starts', {})[template.name] = time.perf_counter()
+
+def _template_finished(sender, template, context, **extra):
+    if has_request_context():
+        start = g.get('_template_starts', {}).pop(template.name, None)
+        if start is not None:
+            observe('quiz_template_render_seconds', time.perf_counter() - start, template=template.name)
+
+def _before_request():
+    g._request_start = time.perf_counter()
+    g._sql_stats = {'queries': 0, 'rows': 0, 'seconds': 0.0, 'statements': {}}
+
+def _after_request(response):
+    start = g.get('_request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    stats = g._sql_stats
+
+    if enabled:
+        observe('quiz_request_duration_seconds', elapsed, endpoint=endpoint, method=request.method)
+        inc('quiz_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+        observe('quiz_sql_queries_per_request', stats['queries'], QUERY_COUNT_BUCKETS, endpoint=endpoint)
+        inc('quiz_sql_rows_fetched_total', stats['rows'], endpoint=endpoint)
+        for label, (count, seconds) in stats['statements'].items():
+            inc('quiz_sql_statements_total', count, statement=label)
+            inc('quiz_sql_statement_seconds_total', seconds, statement=label)
+        
+        # The cookie itself is written after this hook, so size the payload directly
+        if session.modified and session:
+            serializer = current_app.session_interface.get_signing_serializer(current_app)
+            if serializer is not None:
+                observe('quiz_session_cookie_bytes', len(serializer.dumps(dict(session))),
+                        COOKIE_BYTES_BUCKETS, endpoint=endpoint)
+
+    if slow_request_seconds is not None and elapsed >= slow_request_seconds:
+        statements = sorted(stats['statements'].items(), key=lambda item: -item[1][1])[:5]
+        print(f"Slow request: {request.method} {request.path} took {elapsed * 1000:.1f}ms, "
+              f"{stats['queries']} queries ({stats['seconds'] * 1000:.1f}ms), {stats['rows']} rows")
+        for label, (count, seconds) in statements:
+            print(f"    {count}x {seconds * 1000:.1f}ms {label}")
+    return response
+
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """Install instrumentation only when METRICS_ENABLED or SLOW_REQUEST_MS is set.
+
+    With both unset no hooks are registered and connections are plain
+    sqlite3 connections, so there is no per-request overhead. Metrics are
+    kept per process; scrape each worker separately.
+    """
+    global enabled, slow_request_seconds
+    app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '0') == '1')
+    app.config.setdefault('SLOW_REQUEST_MS', os.environ.get('SLOW_REQUEST_MS'))
+    if app.config['SLOW_REQUEST_MS']:
+        slow_request_seconds = float(app.config['SLOW_REQUEST_MS']) / 1000
+    if not app.config['METRICS_ENABLED'] and slow_request_seconds is None:
+        return
+
+    db.connection_factory = InstrumentedConnection
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    enabled = True
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    describe('quiz_request_duration_seconds', 'Request latency by endpoint')
+    describe('quiz_requests_total', 'Requests by endpoint and status')
+    describe('quiz_sql_queries_per_request', 'SQL statements executed per request')
+    describe('quiz_sql_rows_fetched_total', 'Rows fetched from SQLite')
+    describe('quiz_sql_statements_total', 'Executions per SQL statement')
+    describe('quiz_sql_statement_seconds_total', 'Time spent executing each SQL statement')
+    describe('quiz_session_cookie_bytes', 'Size of the session cookie sent to clients')
+    describe('quiz_template_render_seconds', 'Jinja template render time')
@@ -0,0 +1,281 @@
+"""Versioned schema migrations tracked with PRAGMA user_version.
+
+Each migration runs once, inside its own transaction, and must be safe to
+apply to databases created by older versions of the app.
+"""
+
+def _baseline(conn):
+    # Databases from before user accounts have a quiz_results table without
+    # user_id; keep those rows aside instead of dropping them
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(quiz_results)')]
+    if columns and 'user_id' not in columns:
+        conn.execute('ALTER TABLE quiz_results RENAME TO quiz_results_legacy')
+        print("Moved old quiz_results table to quiz_results_legacy")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT NOT NULL,
+            password TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            option1 TEXT NOT NULL,
+            option2 TEXT NOT NULL,
+            option3 TEXT NOT NULL,
+            option4 TEXT NOT NULL,
+            correct_answer INTEGER NOT NULL,
+            difficulty TEXT DEFAULT 'medium'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            total_questions INTEGER NOT NULL,
+            percentage REAL NOT NULL,
+            time_taken INTEGER NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+def _result_indexes(conn):
+    # Covers get_user_results: filter on user_id, newest first, no table lookups
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quiz_results_user_timestamp
+        ON quiz_results (user_id, timestamp DESC, score, total_questions, percentage, time_taken)
+    ''')
+    # Lets get_results_page walk results newest first without a sort step
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quiz_results_timestamp
+        ON quiz_results (timestamp DESC)
+    ''')
+
+def _quiz_attempts(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_expires ON quiz_attempts (expires_at)')
+
+def _result_keyset_index(conn):
+    # Keyset pages order by (timestamp, id); carrying id in the index avoids
+    # a temp B-tree sort for rows sharing a timestamp
+    conn.execute('DROP INDEX IF EXISTS idx_quiz_results_timestamp')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quiz_results_timestamp_id
+        ON quiz_results (timestamp DESC, id DESC)
+    ''')
+
+def _user_stats(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            percentage_sum REAL NOT NULL DEFAULT 0,
+            best_percentage REAL NOT NULL DEFAULT 0,
+            total_time INTEGER NOT NULL DEFAULT 0,
+            last_attempt_at DATETIME,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Backfill from existing history; save_result() keeps it current afterwards
+    conn.execute('''
+        INSERT OR REPLACE INTO user_stats
+            (user_id, attempts, percentage_sum, best_percentage, total_time, last_attempt_at)
+        SELECT user_id, COUNT(*), SUM(percentage), MAX(percentage), SUM(time_taken), MAX(timestamp)
+        FROM quiz_results
+        GROUP BY user_id
+    ''')
+
+def _question_hashes(conn):
+    from question_import import question_hash
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(questions)')]
+    if 'question_hash' not in columns:
+        conn.execute('ALTER TABLE questions ADD COLUMN question_hash TEXT')
+    rows = conn.execute('SELECT id, question FROM questions WHERE question_hash IS NULL').fetchall()
+    conn.executemany('UPDATE questions SET question_hash = ? WHERE id = ?',
+                     [(question_hash(text), question_id) for question_id, text in rows])
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_hash ON questions (question_hash)')
+
+def _user_seen_questions(conn):
+    # Bitset of question ids each user has been served, for adaptive quizzes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_seen_questions (
+            user_id INTEGER PRIMARY KEY,
+            seen BLOB NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+def _answer_analytics(conn):
+    # One row per answered question; attempt_key is the 16-byte attempt id
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_answers (
+            attempt_key BLOB NOT NULL,
+            question_id INTEGER NOT NULL,
+            selected INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            response_ms INTEGER NOT NULL,
+            PRIMARY KEY (attempt_key, question_id)
+        ) WITHOUT ROWID
+    ''')
+    # Running per-question totals so calibration never scans quiz_answers
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            option1 INTEGER NOT NULL DEFAULT 0,
+            option2 INTEGER NOT NULL DEFAULT 0,
+            option3 INTEGER NOT NULL DEFAULT 0,
+            option4 INTEGER NOT NULL DEFAULT 0,
+            response_ms_sum INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _timed_exams(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            question_count INTEGER NOT NULL,
+            duration_seconds INTEGER NOT NULL,
+            starts_at REAL NOT NULL,
+            ends_at REAL NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_exams_window ON exams (ends_at, starts_at)')
+    # Unix time after which an unfinished exam attempt is finalised by the
+    # scheduler; NULL once the attempt has been finalised (or has no deadline)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(quiz_attempts)')]
+    if 'deadline' not in columns:
+        conn.execute('ALTER TABLE quiz_attempts ADD COLUMN deadline REAL')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quiz_attempts_deadline
+        ON quiz_attempts (deadline) WHERE deadline IS NOT NULL
+    ''')
+
+def _result_archive(conn):
+    # Bookkeeping for archive.py: one row per appended batch of column data,
+    # and where each user's rows sit inside it
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            id INTEGER PRIMARY KEY,
+            start INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            first_timestamp TEXT NOT NULL,
+            last_timestamp TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_user_ranges (
+            user_id INTEGER NOT NULL,
+            segment_id INTEGER NOT NULL REFERENCES archive_segments (id),
+            start INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            PRIMARY KEY (user_id, segment_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_user_rollups (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id),
+            attempts INTEGER NOT NULL,
+            percentage_sum REAL NOT NULL,
+            best_percentage REAL NOT NULL,
+            best_time_taken INTEGER NOT NULL,
+            first_timestamp TEXT NOT NULL,
+            last_timestamp TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_daily_rollups (
+            day TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL,
+            percentage_sum REAL NOT NULL,
+            total_time INTEGER NOT NULL
+        )
+    ''')
+    # get_user_results now pages on (timestamp, id), so the covering index
+    # needs id in its sort order too
+    conn.execute('DROP INDEX IF EXISTS idx_quiz_results_user_timestamp')
+    conn.execute('''
+        CREATE INDEX idx_quiz_results_user_timestamp
+        ON quiz_results (user_id, timestamp DESC, id DESC, score, total_questions, percentage, time_taken)
+    ''')
+
+def _exam_attempts(conn):
+    # The one attempt each student gets at an exam; outlives the
+    # quiz_attempts row, which is deleted once the result is shown
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exam_attempts (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            exam_id INTEGER NOT NULL REFERENCES exams (id),
+            attempt_id TEXT NOT NULL,
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, exam_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO exam_attempts (user_id, exam_id, attempt_id)
+        SELECT json_extract(data, '$.user_id'), json_extract(data, '$.exam_id'), id
+        FROM quiz_attempts
+        WHERE json_extract(data, '$.exam_id') IS NOT NULL
+    ''')
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'quiz_results indexes', _result_indexes),
+    (3, 'server-side quiz attempts', _quiz_attempts),
+    (4, 'quiz_results keyset index', _result_keyset_index),
+    (5, 'per-user statistics', _user_stats),
+    (6, 'question text hashes for dedupe', _question_hashes),
+    (7, 'per-user seen questions', _user_seen_questions),
+    (8, 'per-answer analytics', _answer_analytics),
+    (9, 'timed exams', _timed_exams),
+    (10, 'columnar result archive', _result_archive),
+    (11, 'one attempt per exam and student', _exam_attempts),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations and return the number applied"""
+    current = get_version(conn)
+    applied = 0
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another worker may have migrated while we waited for the lock
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+        applied += 1
+    return applied
@@ -1,171 +1,341 @@
-import sqlite3
-from datetime import datetime
-from werkzeug.security import generate_password_hash
-
-DATABASE = 'quiz.db'
-
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    """Initialize database with proper schema handling"""
-    conn = get_db_connection()
-    
-    try:
-        # Check if tables exist and have correct schema
-        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='quiz_results'")
-        table_exists = cursor.fetchone()
-        
-        if table_exists:
-            # Check if user_id column exists
-            cursor = conn.execute("PRAGMA table_info(quiz_results)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'user_id' not in columns:
-                # Drop and recreate table with correct schema
-                conn.execute('DROP TABLE IF EXISTS quiz_results')
-                print("Dropped old quiz_results table with incorrect schema")
-        
-        # Create users table if not exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT NOT NULL,
-                password TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create questions table if not exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                option1 TEXT NOT NULL,
-                option2 TEXT NOT NULL,
-                option3 TEXT NOT NULL,
-                option4 TEXT NOT NULL,
-                correct_answer INTEGER NOT NULL,
-                difficulty TEXT DEFAULT 'medium'
-            )
-        ''')
-        
-        # Create quiz_results table with correct schema
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                score INTEGER NOT NULL,
-                total_questions INTEGER NOT NULL,
-                percentage REAL NOT NULL,
-                time_taken INTEGER NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Create admin user if not exists
-        admin_exists = conn.execute('SELECT * FROM users WHERE username = ?', ('admin',)).fetchone()
-        if not admin_exists:
-            admin_password = generate_password_hash('admin123')
-            conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                        ('admin', 'admin@apquiz.com', admin_password))
-            print("Admin user created")
-        
-        # Insert sample questions if table is empty
-        question_count = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
-        if question_count == 0:
-            sample_questions = [
-                ("What is the 10th term of the AP: 3, 8, 13, 18...?", "48", "53", "58", "63", 2, "easy"),
-                ("Find the sum of first 10 terms of AP: 2, 5, 8, 11...", "155", "165", "175", "185", 2, "medium"),
-                ("Which of the following is NOT an arithmetic progression?", "2, 4, 6, 8", "1, 4, 9, 16", "5, 10, 15, 20", "3, 7, 11, 15", 2, "easy"),
-                ("In AP: 7, _, 19, _, 31 - find the first missing term", "13", "15", "11", "12", 1, "medium"),
-                ("The common difference of AP: -5, -1, 3, 7... is", "4", "-4", "6", "-6", 1, "easy"),
-                ("Sum of first n natural numbers is given by", "n(n+1)", "n(n+1)/2", "n(n-1)/2", "2n+1", 2, "medium"),
-                ("If 5th term of AP is 18 and 10th term is 38, find common difference", "4", "5", "6", "3", 1, "hard"),
-                ("The 20th term of sequence 100, 95, 90, 85... is", "0", "5", "10", "15", 2, "medium"),
-                ("How many terms of AP: 3, 7, 11... make sum 300?", "10", "12", "15", "18", 2, "hard"),
-                ("If first term is 'a' and common difference is 'd', nth term is", "a + nd", "a + (n-1)d", "a + (n+1)d", "nd - a", 2, "easy"),
-                ("Find the sum of first 15 terms of AP: 4, 9, 14, 19...", "525", "545", "565", "585", 3, "medium"),
-                ("Which term of AP: 21, 18, 15, 12... is the first negative term?", "7th", "8th", "9th", "10th", 2, "hard"),
-                ("The arithmetic mean of first n odd numbers is", "n", "(n+1)/2", "n/2", "2n-1", 1, "medium"),
-                ("In an AP, if a = 5, d = 3, then S₁₀ = ?", "185", "195", "175", "165", 1, "easy"),
-                ("The middle term of AP: 1, 4, 7, ..., 97 is", "49", "51", "47", "53", 1, "medium")
-            ]
-            
-            conn.executemany('''
-                INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', sample_questions)
-            print(f"Inserted {len(sample_questions)} sample questions")
-        
-        conn.commit()
-        print("Database initialized successfully!")
-        
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-
-def create_user(username, email, password):
-    conn = get_db_connection()
-    hashed_password = generate_password_hash(password)
-    conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                (username, email, hashed_password))
-    conn.commit()
-    conn.close()
-
-def get_user(username):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    conn.close()
-    return dict(user) if user else None
-
-def get_questions():
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions').fetchall()
-    conn.close()
-    return [dict(q) for q in questions]
-
-def add_question(question, option1, option2, option3, option4, correct_answer, difficulty):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (question, option1, option2, option3, option4, correct_answer, difficulty))
-    conn.commit()
-    conn.close()
-
-def save_result(user_id, score, total, time_taken, percentage):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, score, total, percentage, time_taken))
-    conn.commit()
-    conn.close()
-
-def get_user_results(user_id):
-    conn = get_db_connection()
-    results = conn.execute('''
-        SELECT * FROM quiz_results 
-        WHERE user_id = ? 
-        ORDER BY timestamp DESC
-    ''', (user_id,)).fetchall()
-    conn.close()
-    return [dict(r) for r in results]
-
-def get_all_results():
-    conn = get_db_connection()
-    results = conn.execute('''
-        SELECT qr.*, u.username, u.email 
-        FROM quiz_results qr 
-        JOIN users u ON qr.user_id = u.id 
-        ORDER BY qr.timestamp DESC
-    ''').fetchall()
-    conn.close()
-    return [dict(r) for r in results]
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import db
+from db import connect, get_db_connection
+import question_cache
+import migrations
+import passwords
+import result_writer
+import leaderboard
+import archive
+from question_import import question_hash
+
+# Row types. Each query names its columns in the order of the type's fields
+# and builds the tuple straight from the cursor row.
+USER_COLUMNS = ('id', 'username', 'email', 'password', 'created_at')
+QUESTION_COLUMNS = question_cache.COLUMNS
+RESULT_COLUMNS = ('id', 'user_id', 'score', 'total_questions', 'percentage', 'time_taken', 'timestamp')
+EXAM_COLUMNS = ('id', 'title', 'question_count', 'duration_seconds', 'starts_at', 'ends_at')
+QUESTION_STAT_COLUMNS = QUESTION_COLUMNS + ('attempts', 'correct', 'picked1', 'picked2',
+                                            'picked3', 'picked4', 'response_ms_sum')
+
+User = namedtuple('User', USER_COLUMNS)
+Question = question_cache.Question
+Exam = namedtuple('Exam', EXAM_COLUMNS)
+# username and email are only filled in by the admin listings
+QuizResult = namedtuple('QuizResult', RESULT_COLUMNS + ('username', 'email'), defaults=(None, None))
+
+class QuestionStats(namedtuple('QuestionStats', QUESTION_STAT_COLUMNS)):
+    """A question with its answer aggregates, for difficulty calibration"""
+    __slots__ = ()
+    
+    @property
+    def correct_rate(self):
+        return self.correct / self.attempts * 100 if self.attempts else None
+    
+    @property
+    def mean_response_ms(self):
+        return self.response_ms_sum / self.attempts if self.attempts else None
+
+def _columns(columns, alias=None):
+    return ', '.join(f'{alias}.{c}' if alias else c for c in columns)
+
+def _query(row_type, sql, params=()):
+    """Run a query whose rows are built directly as row_type tuples"""
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = lambda cursor, row: row_type(*row)
+    return cursor.execute(sql, params)
+
+# Database paths this process has seen at the current schema version
+_schema_ready = set()
+
+def init_db(force=False):
+    """Initialize database with proper schema handling.
+
+    A database already at the current schema version costs one PRAGMA
+    user_version read, and nothing at all on later calls in the same
+    process. Migrations and seeding only run when the version is behind,
+    or when force is set.
+    """
+    if not force and db.DATABASE in _schema_ready:
+        return
+    conn = connect()
+    
+    try:
+        if not force and migrations.get_version(conn) == migrations.SCHEMA_VERSION:
+            _schema_ready.add(db.DATABASE)
+            return
+        
+        # Bring the schema up to date (tables, indexes)
+        migrations.migrate(conn)
+        
+        # Create admin user if not exists
+        admin_exists = conn.execute('SELECT 1 FROM users WHERE username = ?', ('admin',)).fetchone()
+        if not admin_exists:
+            from werkzeug.security import generate_password_hash
+            admin_password = generate_password_hash('admin123')
+            conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                        ('admin', 'admin@apquiz.com', admin_password))
+            print("Admin user created")
+        
+        # Insert sample questions if table is empty
+        question_count = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        if question_count == 0:
+            sample_questions = [
+                ("What is the 10th term of the AP: 3, 8, 13, 18...?", "48", "53", "58", "63", 2, "easy"),
+                ("Find the sum of first 10 terms of AP: 2, 5, 8, 11...", "155", "165", "175", "185", 2, "medium"),
+                ("Which of the following is NOT an arithmetic progression?", "2, 4, 6, 8", "1, 4, 9, 16", "5, 10, 15, 20", "3, 7, 11, 15", 2, "easy"),
+                ("In AP: 7, _, 19, _, 31 - find the first missing term", "13", "15", "11", "12", 1, "medium"),
+                ("The common difference of AP: -5, -1, 3, 7... is", "4", "-4", "6", "-6", 1, "easy"),
+                ("Sum of first n natural numbers is given by", "n(n+1)", "n(n+1)/2", "n(n-1)/2", "2n+1", 2, "medium"),
+                ("If 5th term of AP is 18 and 10th term is 38, find common difference", "4", "5", "6", "3", 1, "hard"),
+                ("The 20th term of sequence 100, 95, 90, 85... is", "0", "5", "10", "15", 2, "medium"),
+                ("How many terms of AP: 3, 7, 11... make sum 300?", "10", "12", "15", "18", 2, "hard"),
+                ("If first term is 'a' and common difference is 'd', nth term is", "a + nd", "a + (n-1)d", "a + (n+1)d", "nd - a", 2, "easy"),
+                ("Find the sum of first 15 terms of AP: 4, 9, 14, 19...", "525", "545", "565", "585", 3, "medium"),
+                ("Which term of AP: 21, 18, 15, 12... is the first negative term?", "7th", "8th", "9th", "10th", 2, "hard"),
+                ("The arithmetic mean of first n odd numbers is", "n", "(n+1)/2", "n/2", "2n-1", 1, "medium"),
+                ("In an AP, if a = 5, d = 3, then S₁₀ = ?", "185", "195", "175", "165", 1, "easy"),
+                ("The middle term of AP: 1, 4, 7, ..., 97 is", "49", "51", "47", "53", 1, "medium")
+            ]
+            
+            conn.executemany('''
+                INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty, question_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [q + (question_hash(q[0]),) for q in sample_questions])
+            print(f"Inserted {len(sample_questions)} sample questions")
+        
+        conn.commit()
+        _schema_ready.add(db.DATABASE)
+        print("Database initialized successfully!")
+        
+    except Exception as e:
+        print(f"Error initializing database: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+class UsernameTaken(Exception):
+    """Raised by create_user when the username is already registered"""
+
+def create_user(username, email, password):
+    """Insert a user and return its id.
+    
+    The UNIQUE constraint on username is the only check, so of two
+    concurrent signups for one name exactly one succeeds and the other
+    gets UsernameTaken.
+    """
+    hashed_password = passwords.hash_password(password)
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        INSERT INTO users (username, email, password) VALUES (?, ?, ?)
+        ON CONFLICT (username) DO NOTHING
+    ''', (username, email, hashed_password))
+    conn.commit()
+    if cursor.rowcount == 0:
+        raise UsernameTaken(username)
+    return cursor.lastrowid
+
+def update_password_hash(user_id, hashed_password):
+    conn = get_db_connection()
+    conn.execute('UPDATE users SET password = ? WHERE id = ?', (hashed_password, user_id))
+    conn.commit()
+    forget_user(user_id)
+
+# Recently read users, so login and per-request session checks skip the
+# query. Other workers' changes show up once an entry expires.
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_SIZE = 10000
+_user_cache = OrderedDict()   # ('id', user id) or ('username', name) -> (User, expiry)
+_user_cache_lock = threading.Lock()
+
+def _cached_user(key, column, value):
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if cached is not None and cached[1] > now:
+            _user_cache.move_to_end(key)
+            return cached[0]
+    user = _query(User, f'SELECT {_columns(USER_COLUMNS)} FROM users WHERE {column} = ?',
+                  (value,)).fetchone()
+    if user is not None:
+        entry = (user, now + USER_CACHE_TTL)
+        with _user_cache_lock:
+            _user_cache[('id', user.id)] = _user_cache[('username', user.username)] = entry
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user
+
+def get_user(username):
+    return _cached_user(('username', username), 'username', username)
+
+def get_user_by_id(user_id):
+    return _cached_user(('id', user_id), 'id', user_id)
+
+def forget_user(user_id):
+    with _user_cache_lock:
+        cached = _user_cache.pop(('id', user_id), None)
+        if cached is not None:
+            _user_cache.pop(('username', cached[0].username), None)
+
+def get_questions_by_ids(question_ids):
+    """Questions for the ids in the same order (None for unknown ids), from the question cache"""
+    return question_cache.get_many(question_ids)
+
+def get_questions_with_stats():
+    """Questions with their answer aggregates, for difficulty calibration"""
+    return _query(QuestionStats, f'''
+        SELECT {_columns(QUESTION_COLUMNS, 'q')}, 
+               COALESCE(s.attempts, 0), 
+               COALESCE(s.correct, 0),
+               s.option1, s.option2, s.option3, s.option4,
+               COALESCE(s.response_ms_sum, 0)
+        FROM questions q 
+        LEFT JOIN question_stats s ON s.question_id = q.id
+        ORDER BY q.id
+    ''').fetchall()
+
+def add_question(question, option1, option2, option3, option4, correct_answer, difficulty):
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty, question_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (question, option1, option2, option3, option4, correct_answer, difficulty, question_hash(question)))
+    conn.commit()
+    question_cache.add(cursor.lastrowid, question, option1, option2, option3, option4,
+                       correct_answer, difficulty)
+    return cursor.lastrowid
+
+def answer_rows(attempt_id, questions, answers, response_times):
+    """quiz_answers rows for the answered questions of an attempt"""
+    attempt_key = bytes.fromhex(attempt_id)
+    return [(attempt_key, question.id, selected, int(selected == question.correct_answer), response_ms)
+            for question, selected, response_ms in zip(questions, answers, response_times)]
+
+def save_results_many(results):
+    """Save finished attempts given as (user_id, score, total, time_taken, percentage, answers, seen)"""
+    timestamp = result_writer.timestamp()
+    # Queued for a group commit unless RESULT_WRITE_MODE=sync
+    result_writer.submit_many([
+        ((user_id, score, total, percentage, time_taken, timestamp), list(answers), list(seen))
+        for user_id, score, total, time_taken, percentage, answers, seen in results
+    ])
+    for user_id, score, total, time_taken, percentage, answers, seen in results:
+        leaderboard.record(user_id, percentage, time_taken, timestamp)
+
+def save_result(user_id, score, total, time_taken, percentage, answers=(), seen=()):
+    """seen: bank question ids the attempt showed, for the adaptive seen-set"""
+    save_results_many([(user_id, score, total, time_taken, percentage, answers, seen)])
+
+def get_user_results(user_id, limit=None, before=None):
+    """Return a user's results newest first, continuing into the archive.
+
+    before is the (timestamp, id) of the last row already shown. Archived
+    results are all older than live ones, so they are read only once the
+    live rows run out.
+    """
+    query = f'''
+        SELECT {_columns(RESULT_COLUMNS)} FROM quiz_results 
+        WHERE user_id = ? 
+    '''
+    params = [user_id]
+    if before:
+        query += ' AND (timestamp, id) < (?, ?)'
+        params.extend(before)
+    query += ' ORDER BY timestamp DESC, id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    results = _query(QuizResult, query, params).fetchall()
+    if limit is None or len(results) < limit:
+        remaining = None if limit is None else limit - len(results)
+        results += [QuizResult(*row) for row in
+                    archive.user_results(get_db_connection(), user_id, before, remaining)]
+    return results
+
+def get_user_stats(user_id):
+    """Return the precomputed attempt aggregate for a user"""
+    conn = get_db_connection()
+    stats = conn.execute('''
+        SELECT attempts, percentage_sum, best_percentage, total_time, last_attempt_at
+        FROM user_stats WHERE user_id = ?
+    ''', (user_id,)).fetchone()
+    if not stats:
+        return {'attempts': 0, 'average_percentage': 0.0, 'best_percentage': 0.0,
+                'total_time': 0, 'last_attempt_at': None}
+    return {
+        'attempts': stats['attempts'],
+        'average_percentage': stats['percentage_sum'] / stats['attempts'],
+        'best_percentage': stats['best_percentage'],
+        'total_time': stats['total_time'],
+        'last_attempt_at': stats['last_attempt_at']
+    }
+
+ADMIN_RESULTS_SQL = f'''
+    SELECT {_columns(RESULT_COLUMNS, 'qr')}, u.username, u.email 
+    FROM quiz_results qr 
+    JOIN users u ON qr.user_id = u.id 
+'''
+
+def get_results_page(cursor=None, limit=50):
+    """Return one page of results newest first, plus the cursor for the next page.
+
+    Pages are keyed on (timestamp, id) so each page is an index range scan
+    no matter how deep the admin pages.
+    """
+    query = ADMIN_RESULTS_SQL
+    params = []
+    if cursor:
+        query += ' WHERE (qr.timestamp, qr.id) < (?, ?)'
+        params.extend(cursor)
+    query += ' ORDER BY qr.timestamp DESC, qr.id DESC LIMIT ?'
+    params.append(limit + 1)
+    rows = _query(QuizResult, query, params).fetchall()
+    results = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = (last.timestamp, last.id)
+    return results, next_cursor
+
+def iter_all_results(batch_size=1000):
+    """Yield every result newest first, one keyset page at a time, then the archive"""
+    cursor = None
+    while True:
+        results, cursor = get_results_page(cursor, batch_size)
+        yield from results
+        if cursor is None:
+            break
+    
+    conn = get_db_connection()
+    names = {}
+    for row in archive.iter_results(conn):
+        if row[1] not in names:
+            user = conn.execute('SELECT username, email FROM users WHERE id = ?', (row[1],)).fetchone()
+            names[row[1]] = tuple(user) if user else (None, None)
+        yield QuizResult(*row, *names[row[1]])
+
+def get_archive_summary():
+    return archive.summary(get_db_connection())
+
+def create_exam(title, question_count, duration_seconds, starts_at, ends_at):
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        INSERT INTO exams (title, question_count, duration_seconds, starts_at, ends_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (title, question_count, duration_seconds, starts_at, ends_at))
+    conn.commit()
+    return cursor.lastrowid
+
+def get_exam(exam_id):
+    return _query(Exam, f'SELECT {_columns(EXAM_COLUMNS)} FROM exams WHERE id = ?', (exam_id,)).fetchone()
+
+def get_exams(ending_after):
+    """Exams that have not closed yet, soonest first"""
+    return _query(Exam, f'''
+        SELECT {_columns(EXAM_COLUMNS)} FROM exams 
+        WHERE ends_at > ? 
+        ORDER BY starts_at
+    ''', (ending_after,)).fetchall()
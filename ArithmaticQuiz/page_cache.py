@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from functools import wraps
+from flask import current_app, make_response, render_template, request, session
+from jinja2 import FileSystemBytecodeCache
+import metrics
+
+MAX_ENTRIES = 1024
+
+_entries = OrderedDict()   # (endpoint, username, mtime) -> (body, etag, last_modified)
+_lock = threading.Lock()
+
+def _templates_mtime(templates):
+    folder = os.path.join(current_app.root_path, current_app.template_folder)
+    return max(os.stat(os.path.join(folder, name)).st_mtime for name in templates)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def cached_page(template, layout='base.html'):
+    """Serve a page that only varies by login state from a render cache.
+
+    Entries are keyed on endpoint, username (the navbar shows it) and the
+    newest mtime of the page and its layout, so editing a template
+    invalidates them. Responses carry ETag/Last-Modified and answer
+    conditional requests with 304. Requests with pending flash messages
+    are rendered normally because base.html displays them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            mtime = _templates_mtime((template, layout))
+            key = (request.endpoint, session.get('username'), mtime)
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None:
+                    _entries.move_to_end(key)
+            metrics.inc('quiz_page_cache_total', endpoint=request.endpoint,
+                        result='hit' if entry else 'miss')
+
+            if entry is None:
+                body = render_template(template).encode('utf-8')
+                etag = hashlib.sha1(body).hexdigest()
+                entry = (body, etag, formatdate(mtime, usegmt=True))
+                with _lock:
+                    _entries[key] = entry
+                    while len(_entries) > MAX_ENTRIES:
+                        _entries.popitem(last=False)
+
+            body, etag, last_modified = entry
+            response = make_response(body)
+            response.set_etag(etag)
+            response.headers['Last-Modified'] = last_modified
+            # Content depends on the session cookie, so only the browser may
+            # keep it, and it must revalidate
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+def init_app(app):
+    """Persist compiled templates so fresh workers skip Jinja compilation.
+
+    Jinja runs whatever bytecode it finds there, so by default it uses its
+    own per-user directory, created 0700 and checked for ownership.
+    JINJA_CACHE_DIR overrides it, or turns the cache off when empty.
+    """
+    cache_dir = app.config.setdefault('JINJA_CACHE_DIR', os.environ.get('JINJA_CACHE_DIR'))
+    if cache_dir is None:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    elif cache_dir:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
@@ -0,0 +1,163 @@
+import atexit
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+import metrics
+
+# Hash parameters for new hashes, e.g. 'scrypt' or 'pbkdf2:sha256:600000'.
+# Existing hashes made with other parameters are upgraded on the next login.
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Hashing jobs allowed in flight before new logins are turned away
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', HASH_WORKERS * 8))
+ADMISSION_TIMEOUT = float(os.environ.get('PASSWORD_HASH_ADMISSION_TIMEOUT', '2'))
+VERIFIED_TTL = float(os.environ.get('PASSWORD_VERIFIED_TTL', '300'))
+VERIFIED_CACHE_SIZE = 10000
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; callers should ask the user to retry"""
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_pending = 0
+_pending_lock = threading.Lock()
+
+# user id -> (stored hash, keyed digest of the password, expiry), oldest first
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+_cache_key = secrets.token_bytes(32)
+
+def _get_pool():
+    """Start the pool lazily, and again after a fork, so each worker owns its own"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Imported here: multiprocessing is the slowest import of the app's own modules
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Forking a threaded worker can copy held locks into the child; start
+            # hashing processes from a clean server process instead
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context(method))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _call(job):
+    """Run job(pool), on a new pool if a hashing process has died.
+
+    A killed child leaves the executor broken for good, so it is replaced
+    once; if the new pool breaks as well the caller is told to retry.
+    """
+    global _pool
+    from concurrent.futures.process import BrokenProcessPool
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            return job(pool)
+        except BrokenProcessPool:
+            print("Password hashing pool broke; starting a new one")
+            metrics.inc('quiz_password_hash_pool_restarts_total')
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+    raise HashingBusy()
+
+def _run(function, *args):
+    global _pending
+    if not _slots.acquire(timeout=ADMISSION_TIMEOUT):
+        metrics.inc('quiz_password_hash_rejected_total')
+        raise HashingBusy()
+    with _pending_lock:
+        _pending += 1
+    start = time.perf_counter()
+    try:
+        return _call(lambda pool: pool.submit(function, *args).result())
+    finally:
+        with _pending_lock:
+            _pending -= 1
+        _slots.release()
+        metrics.observe('quiz_password_hash_seconds', time.perf_counter() - start,
+                        operation=function.__name__)
+
+def pending():
+    return _pending
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+def hash_many(passwords):
+    """Hash a batch of passwords across the pool, for offline jobs like roster imports.
+
+    Not subject to the login admission limit, and passwords are sent to
+    the workers in chunks rather than one job each.
+    """
+    if not passwords:
+        return []
+    start = time.perf_counter()
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    hashes = _call(lambda pool: list(pool.map(generate_password_hash, passwords,
+                                              [HASH_METHOD] * len(passwords), chunksize=chunksize)))
+    metrics.observe('quiz_password_hash_seconds', time.perf_counter() - start, operation='hash_many')
+    return hashes
+
+def _method_prefix(method):
+    """The prefix werkzeug writes for a hash method, with its defaults filled in"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        return 'scrypt:' + ':'.join(args or ['32768', '8', '1'])
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"Unsupported hash method {method!r}")
+
+def needs_rehash(stored_hash):
+    """True if a hash was made with parameters other than HASH_METHOD"""
+    return stored_hash.split('$', 1)[0] != _method_prefix(HASH_METHOD)
+
+def _digest(password):
+    return hmac.new(_cache_key, password.encode('utf-8'), hashlib.sha256).digest()
+
+def verify(user_id, stored_hash, password):
+    """Check a password, skipping the slow hash if it was verified recently"""
+    digest = _digest(password)
+    now = time.time()
+    with _verified_lock:
+        cached = _verified.get(user_id)
+        if cached is not None and cached[2] <= now:
+            del _verified[user_id]
+            cached = None
+    if cached and cached[0] == stored_hash and hmac.compare_digest(cached[1], digest):
+        return True
+
+    if not _run(check_password_hash, stored_hash, password):
+        return False
+    with _verified_lock:
+        _verified[user_id] = (stored_hash, digest, now + VERIFIED_TTL)
+        _verified.move_to_end(user_id)
+        while len(_verified) > VERIFIED_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return True
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+atexit.register(shutdown)
+metrics.describe('quiz_password_hash_pending', 'Password hashing jobs queued or running')
+metrics.describe('quiz_password_hash_seconds', 'Time spent waiting for password hashing')
+metrics.describe('quiz_password_hash_rejected_total', 'Logins turned away because the hashing queue was full')
+metrics.describe('quiz_password_hash_pool_restarts_total', 'Hashing pools replaced after a hashing process died')
+metrics.set_gauge('quiz_password_hash_pending', pending)
@@ -0,0 +1,93 @@
+import random
+import threading
+from collections import namedtuple
+from db import get_db_connection
+
+COLUMNS = ('id', 'question', 'option1', 'option2', 'option3', 'option4', 'correct_answer', 'difficulty')
+# Cached rows are handed out as-is, so callers must not expect a copy
+Question = namedtuple('Question', COLUMNS)
+
+_lock = threading.Lock()
+_rows = []            # Question tuples in id order
+_index = {}           # question id -> position in _rows
+_by_difficulty = {}   # difficulty -> list of positions in _rows
+_max_id = 0
+_loaded = False
+
+def _append(row):
+    global _max_id
+    position = len(_rows)
+    _rows.append(row)
+    _index[row[0]] = position
+    _by_difficulty.setdefault(row[7], []).append(position)
+    _max_id = max(_max_id, row[0])
+
+def _fetch_since(conn, last_id):
+    return conn.execute(f'''
+        SELECT {', '.join(COLUMNS)} FROM questions
+        WHERE id > ?
+        ORDER BY id
+    ''', (last_id,)).fetchall()
+
+def refresh():
+    """Load the question bank, or only rows added by other processes since the last load"""
+    global _loaded
+    conn = get_db_connection()
+    if _loaded:
+        latest = conn.execute('SELECT MAX(id) FROM questions').fetchone()[0] or 0
+        if latest <= _max_id:
+            return
+    new_rows = _fetch_since(conn, _max_id)
+    with _lock:
+        for row in new_rows:
+            if row[0] not in _index:
+                _append(Question._make(row))
+        _loaded = True
+
+def add(question_id, question, option1, option2, option3, option4, correct_answer, difficulty):
+    """Write-through hook for a question that was just inserted"""
+    with _lock:
+        if _loaded and question_id not in _index:
+            _append(Question(question_id, question, option1, option2, option3, option4,
+                             correct_answer, difficulty))
+
+def get(question_id):
+    refresh()
+    position = _index.get(question_id)
+    return _rows[position] if position is not None else None
+
+def get_many(question_ids):
+    refresh()
+    with _lock:
+        return [_rows[_index[qid]] if qid in _index else None for qid in question_ids]
+
+def sample(k, difficulty=None):
+    """Pick up to k distinct questions by index without copying the bank"""
+    refresh()
+    with _lock:
+        pool = _by_difficulty.get(difficulty, []) if difficulty else range(len(_rows))
+        picks = random.sample(pool, min(k, len(pool)))
+        return [_rows[p] for p in picks]
+
+def pick(difficulty, reject, tries=16):
+    """Pick one question of a difficulty whose id reject() does not refuse.
+
+    Random probes make the common case O(1); only when most of the bucket
+    is refused does it fall back to one scan from a random offset.
+    """
+    refresh()
+    with _lock:
+        bucket = _by_difficulty.get(difficulty)
+        if not bucket:
+            return None
+        size = len(bucket)
+        for _ in range(tries):
+            row = _rows[bucket[random.randrange(size)]]
+            if not reject(row[0]):
+                return row
+        offset = random.randrange(size)
+        for i in range(size):
+            row = _rows[bucket[(offset + i) % size]]
+            if not reject(row[0]):
+                return row
+    return None
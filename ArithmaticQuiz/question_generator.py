@@ -0,0 +1,112 @@
+import random
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+def ordinal(n):
+    if 10 <= n % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
+
+def format_terms(a, d, count=4):
+    return ', '.join(str(a + i * d) for i in range(count))
+
+def _nonzero(rng, low, high):
+    value = 0
+    while value == 0:
+        value = rng.randint(low, high)
+    return value
+
+def _build(rng, question, correct, distractors, difficulty):
+    """Pick three distinct distractors and place the answer in a random slot"""
+    options = []
+    for value in distractors:
+        if value != correct and value not in options:
+            options.append(value)
+    step = 1
+    while len(options) < 3:
+        # Fall back to nearby values when the common mistakes coincide
+        for value in (correct + step, correct - step):
+            if value not in options and len(options) < 3:
+                options.append(value)
+        step += 1
+    options = options[:3]
+    slot = rng.randrange(4)
+    options.insert(slot, correct)
+    return {
+        'question': question,
+        'option1': str(options[0]),
+        'option2': str(options[1]),
+        'option3': str(options[2]),
+        'option4': str(options[3]),
+        'correct_answer': slot + 1,
+        'difficulty': difficulty
+    }
+
+def nth_term(rng):
+    a, d, n = rng.randint(-20, 50), _nonzero(rng, -9, 12), rng.randint(8, 40)
+    correct = a + (n - 1) * d
+    return _build(rng, f"What is the {ordinal(n)} term of the AP: {format_terms(a, d)}...?",
+                  correct, [a + n * d, a + (n - 2) * d, n * d], 'easy')
+
+def common_difference(rng):
+    a, d = rng.randint(-30, 30), _nonzero(rng, -15, 15)
+    return _build(rng, f"The common difference of AP: {format_terms(a, d)}... is",
+                  d, [-d, a, d + a, 2 * d], 'easy')
+
+def missing_term(rng):
+    a, d = rng.randint(-20, 40), _nonzero(rng, -9, 12)
+    terms = [str(a + i * d) for i in range(5)]
+    terms[1] = terms[3] = '_'
+    return _build(rng, f"In AP: {', '.join(terms)} - find the first missing term",
+                  a + d, [a + 2 * d, a - d, a + 3 * d], 'medium')
+
+def sum_of_terms(rng):
+    a, d, n = rng.randint(-10, 30), _nonzero(rng, -5, 9), rng.randint(6, 30)
+    correct = n * (2 * a + (n - 1) * d) // 2
+    return _build(rng, f"Find the sum of first {n} terms of AP: {format_terms(a, d)}...",
+                  correct, [n * (2 * a + n * d) // 2, n * (a + (n - 1) * d) // 2, correct + n * d], 'medium')
+
+def difference_from_two_terms(rng):
+    a, d = rng.randint(-20, 40), _nonzero(rng, -9, 12)
+    p = rng.randint(2, 10)
+    q = p + rng.randint(2, 10)
+    term_p, term_q = a + (p - 1) * d, a + (q - 1) * d
+    return _build(rng, f"If {ordinal(p)} term of AP is {term_p} and {ordinal(q)} term is {term_q}, "
+                       f"find common difference",
+                  d, [-d, d + 1, (term_q - term_p) // (q - p + 1)], 'hard')
+
+def number_of_terms(rng):
+    a, d, n = rng.randint(-20, 40), _nonzero(rng, 1, 12) * rng.choice((1, -1)), rng.randint(8, 60)
+    last = a + (n - 1) * d
+    return _build(rng, f"How many terms are there in the AP: {format_terms(a, d, 3)}, ..., {last}?",
+                  n, [n - 1, n + 1, abs(last - a) // abs(d)], 'hard')
+
+TEMPLATES = {
+    'easy': (nth_term, common_difference),
+    'medium': (missing_term, sum_of_terms),
+    'hard': (difference_from_two_terms, number_of_terms),
+}
+ALL_TEMPLATES = tuple(t for templates in TEMPLATES.values() for t in templates)
+
+def generate(count, difficulty=None, seed=None):
+    """Generate count question dicts (bank row layout, without id).
+
+    A seed makes the batch reproducible. Each question's template is drawn
+    at random from the difficulty's templates (or all of them), then called
+    once per question.
+    """
+    rng = random.Random(seed)
+    templates = TEMPLATES[difficulty] if difficulty else ALL_TEMPLATES
+    return [template(rng) for template in rng.choices(templates, k=count)]
+
+def iter_records(count, difficulty=None, seed=None, batch_size=1000):
+    """Yield (index, question) pairs in batches, for question_import.import_records()"""
+    produced = 0
+    while produced < count:
+        size = min(batch_size, count - produced)
+        batch_seed = None if seed is None else seed + produced
+        for question in generate(size, difficulty, batch_seed):
+            produced += 1
+            yield produced, question
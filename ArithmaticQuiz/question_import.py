@@ -0,0 +1,122 @@
+import csv
+import hashlib
+import json
+import time
+from db import get_db_connection
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+BATCH_SIZE = 500
+
+def question_hash(text):
+    """Dedupe key for question text, insensitive to case and spacing"""
+    normalized = ' '.join(text.split()).lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.json'):
+        return 'json'
+    raise ValueError(f"Unsupported file type: {filename}")
+
+def iter_records(stream, file_format):
+    """Yield (line_number, record dict) pairs from a text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                # Reported as a rejected row by validate()
+                yield line_number, None
+    elif file_format == 'json':
+        for index, record in enumerate(json.load(stream), 1):
+            yield index, record
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+def validate(record):
+    """Return an insertable row tuple or raise ValueError with the reason"""
+    if not isinstance(record, dict):
+        raise ValueError('not a JSON object')
+    question = str(record.get('question') or '').strip()
+    if not question:
+        raise ValueError('missing question text')
+    options = [str(record.get(f'option{i}') or '').strip() for i in range(1, 5)]
+    if not all(options):
+        raise ValueError('all four options are required')
+    try:
+        correct_answer = int(record.get('correct_answer'))
+    except (TypeError, ValueError):
+        raise ValueError('correct_answer must be a number from 1 to 4')
+    if correct_answer not in (1, 2, 3, 4):
+        raise ValueError('correct_answer must be a number from 1 to 4')
+    difficulty = str(record.get('difficulty') or 'medium').strip().lower()
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    return (question, *options, correct_answer, difficulty, question_hash(question))
+
+def _insert_batch(conn, batch):
+    try:
+        conn.executemany('''
+            INSERT INTO questions (question, option1, option2, option3, option4, correct_answer, difficulty, question_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def import_questions(stream, file_format, batch_size=BATCH_SIZE):
+    """Validate, dedupe and insert questions from a file stream"""
+    return import_records(iter_records(stream, file_format), batch_size)
+
+def import_records(records, batch_size=BATCH_SIZE):
+    """Validate, dedupe and insert (line, record) pairs in batched transactions.
+
+    Returns a summary dict with inserted/duplicate counts, rejected rows as
+    (line, reason) pairs, and throughput.
+    """
+    conn = get_db_connection()
+    start = time.perf_counter()
+    known = {row[0] for row in conn.execute('SELECT question_hash FROM questions WHERE question_hash IS NOT NULL')}
+    inserted = duplicates = 0
+    rejected = []
+    batch = []
+
+    for line_number, record in records:
+        try:
+            row = validate(record)
+        except ValueError as e:
+            rejected.append((line_number, str(e)))
+            continue
+        if row[-1] in known:
+            duplicates += 1
+            continue
+        known.add(row[-1])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _insert_batch(conn, batch)
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        _insert_batch(conn, batch)
+        inserted += len(batch)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'inserted': inserted,
+        'duplicates': duplicates,
+        'rejected': rejected,
+        'seconds': elapsed,
+        'rows_per_second': (inserted + duplicates + len(rejected)) / elapsed if elapsed else 0.0
+    }
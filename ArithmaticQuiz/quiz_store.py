@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from db import get_db_connection
+
+# Attempts idle for longer than this are discarded
+DEFAULT_TTL = 2 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+
+def new_attempt_id():
+    return uuid.uuid4().hex
+
+class MemoryAttemptStore:
+    """In-process LRU store for quiz attempts with TTL eviction"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, attempt_id):
+        with self._lock:
+            entry = self._entries.get(attempt_id)
+            if entry is None:
+                return None
+            expires_at, attempt = entry
+            if expires_at < time.time():
+                del self._entries[attempt_id]
+                return None
+            self._entries.move_to_end(attempt_id)
+            return attempt
+
+    def save(self, attempt_id, attempt):
+        with self._lock:
+            self._entries[attempt_id] = (time.time() + self.ttl, attempt)
+            self._entries.move_to_end(attempt_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, attempt_id):
+        with self._lock:
+            self._entries.pop(attempt_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at < now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+class SQLiteAttemptStore:
+    """Attempt store backed by a quiz_attempts table, shared by all workers"""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+
+    def _conn(self):
+        # quiz_attempts is created by migration 3 in init_db()
+        return get_db_connection()
+
+    def get(self, attempt_id):
+        row = self._conn().execute(
+            'SELECT data FROM quiz_attempts WHERE id = ? AND expires_at >= ?',
+            (attempt_id, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, attempt_id, attempt):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO quiz_attempts (id, data, expires_at) VALUES (?, ?, ?)',
+                     (attempt_id, json.dumps(attempt, separators=(',', ':')), time.time() + self.ttl))
+        conn.commit()
+
+    def delete(self, attempt_id):
+        conn = self._conn()
+        conn.execute('DELETE FROM quiz_attempts WHERE id = ?', (attempt_id,))
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        cursor = conn.execute('DELETE FROM quiz_attempts WHERE expires_at < ?', (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+class ExamAttemptStore(SQLiteAttemptStore):
+    """SQLite store for timed attempts, which carry a deadline column.
+
+    Any worker's exam scheduler may finalise an attempt once its deadline
+    passes, so finalisation is claimed by clearing the deadline (see
+    exams.py) and saves of an unfinished attempt never overwrite one that
+    was already claimed.
+    """
+
+    def _expires_at(self, attempt):
+        return max(time.time(), attempt.get('deadline') or 0) + self.ttl
+
+    def save(self, attempt_id, attempt):
+        conn = self._conn()
+        data = json.dumps(attempt, separators=(',', ':'))
+        if 'result' in attempt:
+            conn.execute('''
+                INSERT OR REPLACE INTO quiz_attempts (id, data, expires_at, deadline)
+                VALUES (?, ?, ?, NULL)
+            ''', (attempt_id, data, self._expires_at(attempt)))
+        else:
+            conn.execute('''
+                INSERT INTO quiz_attempts (id, data, expires_at, deadline) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+                WHERE deadline IS NOT NULL
+            ''', (attempt_id, data, self._expires_at(attempt), attempt['deadline']))
+        conn.commit()
+
+    def start(self, user_id, exam_id, attempt_id, attempt):
+        """Save attempt as the user's only attempt at an exam.
+
+        Returns (attempt_id, attempt) for the new attempt, or for the one
+        the user started before, whose attempt is None once it is gone.
+        """
+        conn = self._conn()
+        cursor = conn.execute('''
+            INSERT INTO exam_attempts (user_id, exam_id, attempt_id) VALUES (?, ?, ?)
+            ON CONFLICT (user_id, exam_id) DO NOTHING
+        ''', (user_id, exam_id, attempt_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            existing = conn.execute(
+                'SELECT attempt_id FROM exam_attempts WHERE user_id = ? AND exam_id = ?',
+                (user_id, exam_id)).fetchone()[0]
+            return existing, self.get(existing)
+        # Commits the exam_attempts row with the attempt itself
+        self.save(attempt_id, attempt)
+        return attempt_id, attempt
+
+def create_store(kind='memory', ttl=DEFAULT_TTL):
+    """Build the attempt store named by kind ('memory' or 'sqlite')"""
+    if kind == 'memory':
+        return MemoryAttemptStore(ttl=ttl)
+    if kind == 'sqlite':
+        return SQLiteAttemptStore(ttl=ttl)
+    raise ValueError(f"Unknown quiz store: {kind}")
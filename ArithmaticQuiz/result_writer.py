@@ -0,0 +1,186 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+import adaptive
+import db
+import metrics
+
+# 'async' queues results for a background group commit; 'sync' writes them
+# inside the request like before
+WRITE_MODE = os.environ.get('RESULT_WRITE_MODE', 'async')
+BATCH_SIZE = int(os.environ.get('RESULT_BATCH_SIZE', '200'))
+FLUSH_INTERVAL = float(os.environ.get('RESULT_FLUSH_MS', '5')) / 1000
+QUEUE_SIZE = int(os.environ.get('RESULT_QUEUE_SIZE', '10000'))
+# PRAGMA synchronous for the writer connection: FULL fsyncs every group commit
+SYNCHRONOUS = os.environ.get('RESULT_SYNCHRONOUS', 'NORMAL')
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_thread = None
+_thread_pid = None
+_start_lock = threading.Lock()
+_stopping = False
+
+def timestamp():
+    """Current time in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def write_results(conn, entries):
+    """Write (result row, answer rows, seen question ids) entries; the caller commits.
+
+    Result rows are (user_id, score, total, percentage, time_taken,
+    timestamp) and are folded into user_stats. Answer rows are
+    (attempt_key, question_id, selected, is_correct, response_ms) and are
+    folded into question_stats. The question ids the attempt showed are
+    merged into the user's adaptive seen-set.
+    """
+    rows = [entry[0] for entry in entries]
+    answers = [answer for entry in entries for answer in entry[1]]
+    seen = {}
+    for entry in entries:
+        if entry[2]:
+            seen.setdefault(entry[0][0], []).extend(entry[2])
+    conn.executemany('''
+        INSERT INTO quiz_results (user_id, score, total_questions, percentage, time_taken, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    # Keep the dashboard aggregate in step with the new rows
+    conn.executemany('''
+        INSERT INTO user_stats (user_id, attempts, percentage_sum, best_percentage, total_time, last_attempt_at)
+        VALUES (?, 1, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            attempts = attempts + 1,
+            percentage_sum = percentage_sum + excluded.percentage_sum,
+            best_percentage = MAX(best_percentage, excluded.best_percentage),
+            total_time = total_time + excluded.total_time,
+            last_attempt_at = MAX(COALESCE(last_attempt_at, ''), excluded.last_attempt_at)
+    ''', [(r[0], r[3], r[3], r[4], r[5]) for r in rows])
+    if answers:
+        write_answers(conn, answers)
+    if seen:
+        adaptive.merge_seen(conn, seen)
+
+def write_answers(conn, answers):
+    conn.executemany('''
+        INSERT OR IGNORE INTO quiz_answers (attempt_key, question_id, selected, is_correct, response_ms)
+        VALUES (?, ?, ?, ?, ?)
+    ''', answers)
+    conn.executemany('''
+        INSERT INTO question_stats (question_id, attempts, correct, option1, option2, option3, option4, response_ms_sum)
+        VALUES (?, 1, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (question_id) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct,
+            option1 = option1 + excluded.option1,
+            option2 = option2 + excluded.option2,
+            option3 = option3 + excluded.option3,
+            option4 = option4 + excluded.option4,
+            response_ms_sum = response_ms_sum + excluded.response_ms_sum
+    ''', [(a[1], a[3], a[2] == 1, a[2] == 2, a[2] == 3, a[2] == 4, a[4]) for a in answers])
+
+def _commit(conn, entries):
+    try:
+        write_results(conn, entries)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Result writer batch of {len(entries)} failed, retrying one by one: {e}")
+        for entry in entries:
+            try:
+                write_results(conn, [entry])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Result writer dropped {entry[0]}: {e}")
+
+def _run():
+    conn = db.connect()
+    conn.execute(f'PRAGMA synchronous={SYNCHRONOUS}')
+    while True:
+        entry = _queue.get()
+        if entry is None:
+            _queue.task_done()
+            break
+        batch = [entry]
+        stop = False
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        # Gather whatever else arrives within the flush window
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = _queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                stop = True
+                break
+            batch.append(entry)
+        _commit(conn, batch)
+        metrics.observe('quiz_result_batch_size', len(batch), (1, 2, 5, 10, 25, 50, 100, 200, 500))
+        for _ in range(len(batch) + stop):
+            _queue.task_done()
+        if stop:
+            break
+    conn.close()
+
+def _ensure_started():
+    global _thread, _thread_pid
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        return
+    with _start_lock:
+        if _thread is None or _thread_pid != os.getpid() or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='result-writer', daemon=True)
+            _thread_pid = os.getpid()
+            _thread.start()
+
+def submit_many(entries, conn=None):
+    """Record finished attempts given as write_results() entries.
+
+    In async mode the entries are queued for the next group commit. Those
+    that do not fit in the queue (or arrive while the writer is shutting
+    down) are written synchronously on conn instead, in one transaction,
+    which applies backpressure to callers.
+    """
+    entries = list(entries)
+    if WRITE_MODE == 'async' and not _stopping:
+        _ensure_started()
+        queued = 0
+        for entry in entries:
+            try:
+                _queue.put(entry, timeout=0.05)
+            except queue.Full:
+                metrics.inc('quiz_result_queue_full_total', len(entries) - queued)
+                break
+            queued += 1
+        entries = entries[queued:]
+        if not entries:
+            return
+
+    conn = conn or db.get_db_connection()
+    try:
+        write_results(conn, entries)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def flush():
+    """Block until every queued result has been committed"""
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        _queue.join()
+
+def shutdown():
+    """Flush outstanding results and stop the writer thread"""
+    global _stopping
+    _stopping = True
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        _queue.put(None)
+        _thread.join(timeout=30)
+
+atexit.register(shutdown)
+metrics.describe('quiz_result_batch_size', 'Results written per group commit')
+metrics.describe('quiz_result_queue_full_total', 'Results written synchronously because the queue was full')
+metrics.describe('quiz_result_queue_depth', 'Results waiting for the background writer')
+metrics.set_gauge('quiz_result_queue_depth', _queue.qsize)
@@ -0,0 +1,35 @@
+"""Finishing a quiz before any answer is recorded still saves a result"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as quiz_app
+import result_writer
+
+@pytest.fixture
+def client(tmp_path):
+    app = quiz_app.create_app({'DATABASE': str(tmp_path / 'quiz.db'), 'EXAM_SCHEDULER': False,
+                               'JINJA_CACHE_DIR': ''})
+    quiz_app.prepare(app)
+    client = app.test_client()
+    client.post('/register', data={'username': 'student', 'email': 'student@example.com',
+                                   'password': 'secret', 'confirm_password': 'secret'})
+    client.post('/login', data={'username': 'student', 'password': 'secret'})
+    yield client
+    result_writer.flush()
+
+def test_api_submit_with_no_answers(client):
+    assert client.post('/api/quiz/start', json={}).status_code == 200
+    response = client.post('/api/quiz/submit', json={'answers': []})
+    assert response.status_code == 200
+    assert response.get_json()['score'] == 0
+    assert response.get_json()['percentage'] == 0
+
+def test_result_straight_after_quiz(client):
+    assert client.get('/quiz').status_code == 200
+    response = client.get('/result')
+    assert response.status_code == 200
+    assert b'Quiz Complete' in response.data
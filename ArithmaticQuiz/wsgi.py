@@ -0,0 +1,11 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the
+database is migrated and seeded once before the workers are forked.
+"""
+from app import create_app, prepare
+
+app = create_app()
+prepare(app)